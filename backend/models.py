@@ -4,6 +4,7 @@ app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],  # For development, allow all. For production, specify your frontend URL.
     allow_credentials=True,
-    allow_methods=["*"],
+    allow_methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"],
     allow_headers=["*"],
+    max_age=86400,  # Let browsers cache preflight responses for a day
 ) 
\ No newline at end of file
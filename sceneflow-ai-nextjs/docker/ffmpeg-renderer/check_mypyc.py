@@ -0,0 +1,94 @@
+"""
+Build-time check for the mypyc-compiled ffmpeg_utils.
+
+Builds representative Ken Burns, concatenation and rendition commands with the
+compiled extension and with the pure-Python source, at integral and fractional
+frame rates (job specs send fps as any JSON number), and exits non-zero if the
+compiled module raises or produces a different command. The Dockerfile drops
+the compiled module when this fails.
+
+Ken Burns geometry is given as floats: float-annotated parameters unbox under
+mypyc, so an int zoom of 1 prints as "1.0" there (the same value to FFmpeg).
+
+Usage: python check_mypyc.py   (from the directory holding ffmpeg_utils)
+"""
+
+import importlib.util
+import os
+import sys
+import tempfile
+
+import ffmpeg_utils as compiled
+
+FRAME_RATES = (24, 30.0, 29.97, 23.976)
+
+SEGMENTS = [
+    {'localFile': 'img0.png', 'duration': 1.5, 'kenBurns': {'zoomStart': 1.0, 'zoomEnd': 1.2, 'panX': 0.5}},
+    {'localFile': 'img1.jpg', 'duration': 2, 'kenBurns': {'zoomStart': 1.2, 'zoomEnd': 1.2, 'panY': 0.5}},
+    {'localFile': 'img2.jpg', 'duration': 1.0, 'kenBurns': {
+        'startRect': {'x': 0.0, 'y': 0.0, 'width': 0.5, 'height': 0.5},
+        'endRect': {'x': 0.5, 'y': 0.5, 'width': 0.5, 'height': 0.5},
+    }},
+]
+
+VIDEO_SEGMENTS = [
+    {'localFile': 'v0.mp4', 'duration': 2, 'audioSource': 'original'},
+    {'localFile': 'v1.mp4', 'duration': 2.5, 'audioSource': 'original', 'pauseDuration': 0.5},
+    {'localFile': 'v2.mp4', 'duration': 2, 'audioSource': 'none', 'watermarkCropPercent': 5},
+]
+
+AUDIO_CLIPS = [{'localFile': 'a0.mp3', 'startTime': 0.5, 'duration': 2, 'volume': 0.8}]
+
+TEXT_OVERLAYS = [{'text': 'Title', 'x': 100, 'y': 100, 'startTime': 0.5, 'duration': 2}]
+
+
+def load_source_module():
+    """Import ffmpeg_utils.py directly, bypassing the compiled extension."""
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'ffmpeg_utils.py')
+    spec = importlib.util.spec_from_file_location('ffmpeg_utils_source', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def build_commands(module, fps, temp_dir):
+    """Commands covering the fps-taking builders, for one module and frame rate."""
+    output = os.path.join(temp_dir, 'out.mp4')
+    return [
+        module.build_ffmpeg_command(SEGMENTS, AUDIO_CLIPS, output, '720p', fps, temp_dir),
+        module.build_ffmpeg_command(SEGMENTS, AUDIO_CLIPS, output, '720p', fps, temp_dir,
+                                    max_segments_per_pass=2),
+        module.build_concat_ffmpeg_command(VIDEO_SEGMENTS, AUDIO_CLIPS, output, '720p', fps, temp_dir,
+                                           text_overlays=TEXT_OVERLAYS),
+        module.build_renditions_command(output, [('720p', os.path.join(temp_dir, 'out_720p.mp4'))]),
+    ]
+
+
+def main() -> int:
+    if not compiled.__file__.endswith(('.so', '.pyd')):
+        print(f"ffmpeg_utils is not compiled ({compiled.__file__})")
+        return 1
+    source = load_source_module()
+
+    failures = 0
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for fps in FRAME_RATES:
+            expected = build_commands(source, fps, temp_dir)
+            try:
+                actual = build_commands(compiled, fps, temp_dir)
+            except Exception as e:
+                print(f"fps={fps}: compiled module raised {type(e).__name__}: {e}")
+                failures += 1
+                continue
+            if actual != expected:
+                print(f"fps={fps}: compiled module built a different command")
+                failures += 1
+
+    if failures:
+        return 1
+    print(f"Compiled ffmpeg_utils matches the source at fps {', '.join(map(str, FRAME_RATES))}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -10,9 +10,20 @@ Provides functions for building FFmpeg commands with:
 
 import os
 import subprocess
+import time
 import json
+import logging
 import re
-from typing import List, Dict, Any, Optional
+import shlex
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from fractions import Fraction
+from functools import lru_cache, partial
+from itertools import chain
+from typing import List, Dict, Any, Optional, Callable, Tuple, Deque, BinaryIO, Union
+
+logger = logging.getLogger(__name__)
 
 # Resolution presets
 RESOLUTIONS = {
@@ -21,14 +32,132 @@ RESOLUTIONS = {
     '4K': {'width': 3840, 'height': 2160},
 }
 
+# Frame rate used when a job spec's fps is missing or unusable
+DEFAULT_FPS = 24
+
+# Job specs send fps as a JSON number (24, 29.97). A Union rather than float keeps
+# ints boxed when mypyc compiles this module, so 24 still formats as "24", not "24.0"
+FrameRate = Union[int, float]
+
 # Ken Burns effect parameters
 # We scale images 2x to allow for pan/zoom headroom
 SCALE_FACTOR = 2
 
+# Segment filter bodies, without the [i:v]/[vi] labels so equal Ken Burns
+# settings share one cached body whatever the segment position.
+# zoompan segment; z/x/y are quoted expressions or constants
+KB_TEMPLATE = (
+    "scale={sw}:{sh}:force_original_aspect_ratio=increase,crop={sw}:{sh},"
+    "zoompan=z={z}:x={x}:y={y}:d={d}:s={w}x{h}:fps={fps}"
+)
+# Constant-zoom segment: scale/crop to the zoomed canvas, then {motion}
+CROP_PAN_TEMPLATE = (
+    "scale={cw}:{ch}:force_original_aspect_ratio=increase,crop={cw}:{ch},setsar=1,{motion}"
+)
+# Repeat the single still frame for the segment, timestamped at the output rate
+HOLD_TEMPLATE = "loop=loop={loops}:size=1:start=0,settb=1/{fps},setpts=N,fps={fps}"
+# Output-sized viewport; x/y are expressions in the frame number n
+VIEWPORT_CROP_TEMPLATE = "crop={w}:{h}:x={x}:y={y}"
+
 # Bottom crop range for uploaded beat watermark removal (matches segmentVideoCrop.ts)
 WATERMARK_CROP_MIN = 2
 WATERMARK_CROP_MAX = 10
 
+# Software encoder used when no hardware encoder is requested or available
+DEFAULT_VIDEO_ENCODER = 'libx264'
+
+# Near-lossless all-intra video + lossless audio for renders that are re-encoded later;
+# several times faster to encode/decode than CRF 23 and free of generational loss
+INTERMEDIATE_VIDEO_ARGS = ['-c:v', 'libx264', '-preset', 'ultrafast', '-qp', '18', '-g', '1', '-pix_fmt', 'yuv420p']
+INTERMEDIATE_AUDIO_ARGS = ['-c:a', 'flac']
+INTERMEDIATE_EXTENSION = '.mkv'
+
+# libx264 speed preset: 'faster' is ~1.5x quicker than 'medium' at near-identical quality
+DEFAULT_X264_PRESET = 'faster'
+
+# Output options per video encoder. Hardware encoders are tuned to roughly match
+# libx264 CRF 23 quality; all of them take system-memory frames from the filter graph.
+VIDEO_ENCODER_ARGS = {
+    'libx264': ['-c:v', 'libx264', '-crf', '23', '-pix_fmt', 'yuv420p'],
+    'h264_nvenc': ['-c:v', 'h264_nvenc', '-preset', 'p4', '-rc', 'vbr', '-cq', '23', '-b:v', '0',
+                   '-pix_fmt', 'yuv420p'],
+    'hevc_nvenc': ['-c:v', 'hevc_nvenc', '-preset', 'p4', '-rc', 'vbr', '-cq', '23', '-b:v', '0',
+                   '-pix_fmt', 'yuv420p', '-tag:v', 'hvc1'],
+    'h264_qsv': ['-c:v', 'h264_qsv', '-global_quality', '23', '-look_ahead', '0', '-pix_fmt', 'nv12'],
+    'h264_amf': ['-c:v', 'h264_amf', '-usage', 'transcoding', '-quality', 'balanced',
+                 '-rc', 'cqp', '-qp_i', '23', '-qp_p', '23', '-pix_fmt', 'yuv420p'],
+    # VAAPI frames are uploaded at the end of the filter graph (see build_encoder_upload_filter)
+    'h264_vaapi': ['-c:v', 'h264_vaapi', '-qp', '23'],
+}
+
+# Render node used for VAAPI encoding
+VAAPI_DEVICE = '/dev/dri/renderD128'
+
+# Decoders accepted for -hwaccel on video inputs
+HWACCEL_METHODS = ('cuda', 'qsv', 'vaapi')
+
+# Decoders whose frames can stay in GPU memory through the concat graph (scale_cuda)
+GPU_RESIDENT_HWACCELS = ('cuda',)
+
+# Input codecs NVDEC decodes (anything else falls back to CPU frames)
+GPU_DECODABLE_CODECS = ('h264', 'hevc')
+
+# Encoders compiled into the local ffmpeg binary (filled on first use)
+_available_encoders: Optional[frozenset] = None
+
+# Hardware encoders checked with a one-frame test encode: name -> usable on this host
+_working_encoders: Dict[str, bool] = {}
+
+# cgroup CPU quota (v2, then v1): containers are limited here while affinity still shows every host CPU
+CGROUP_CPU_MAX = '/sys/fs/cgroup/cpu.max'
+CGROUP_V1_CPU_QUOTA = '/sys/fs/cgroup/cpu/cpu.cfs_quota_us'
+CGROUP_V1_CPU_PERIOD = '/sys/fs/cgroup/cpu/cpu.cfs_period_us'
+
+# Concurrent ffprobe processes when inspecting concat inputs
+PROBE_WORKERS = 8
+
+# Segment inputs FFmpeg reads straight from the network instead of a downloaded file
+REMOTE_INPUT_PREFIXES = ('http://', 'https://')
+
+# Input options for remote inputs: resume the HTTP stream after a dropped connection
+REMOTE_INPUT_ARGS = ['-reconnect', '1', '-reconnect_on_network_error', '1', '-reconnect_delay_max', '5']
+
+# Protocols the concat demuxer may open when its list names remote inputs
+REMOTE_CONCAT_PROTOCOLS = 'file,http,https,tcp,tls,crypto'
+
+# Segments per filter graph; larger graphs slow down super-linearly
+MAX_SEGMENTS_PER_PASS = 32
+
+
+@lru_cache(maxsize=None)
+def resolve_resolution(resolution: str) -> Tuple[int, int]:
+    """Output (width, height) for a resolution preset (1080p when unknown)."""
+    res = RESOLUTIONS.get(resolution, RESOLUTIONS['1080p'])
+    return res['width'], res['height']
+
+
+def validate_render_shape(resolution: Any, fps: Any) -> Tuple[str, FrameRate]:
+    """
+    Normalize a job's resolution and fps once, before any command is built.
+    
+    Unknown resolutions fall back to 1080p and missing, non-numeric or
+    non-positive frame rates to DEFAULT_FPS (both logged). Integral rates
+    become ints, so 24 and 24.0 share one compiled pipeline and filter text;
+    fractional rates such as 29.97 are returned as floats, which every
+    FrameRate builder accepts (interpreted or mypyc-compiled).
+    """
+    if resolution not in RESOLUTIONS:
+        logger.warning("[FFmpeg] Unknown resolution %r; using 1080p", resolution)
+        resolution = '1080p'
+    try:
+        rate = float(fps)
+    except (TypeError, ValueError):
+        rate = 0.0
+    if isinstance(fps, bool) or not 0 < rate < float('inf'):
+        logger.warning("[FFmpeg] Invalid fps %r; using %s", fps, DEFAULT_FPS)
+        return resolution, DEFAULT_FPS
+    return resolution, int(rate) if rate.is_integer() else rate
+
 
 def clamp_watermark_crop_percent(value: Any) -> Optional[int]:
     """Return validated crop percent (2–10) or None when disabled/invalid."""
@@ -77,6 +206,207 @@ def build_atempo_filter_chain(rate: float) -> str:
     return ",".join(parts)
 
 
+def get_available_encoders() -> frozenset:
+    """
+    Return the encoder names compiled into the local ffmpeg binary.
+    Parsed once from `ffmpeg -encoders` and cached for the life of the process.
+    """
+    global _available_encoders
+    if _available_encoders is not None:
+        return _available_encoders
+
+    names = set()
+    try:
+        result = subprocess.run(
+            ['ffmpeg', '-hide_banner', '-encoders'],
+            stdin=subprocess.DEVNULL,
+            capture_output=True,
+            text=True,
+            timeout=30,
+        )
+        # Encoder lines look like: " V....D h264_nvenc   NVIDIA NVENC H.264 encoder"
+        for line in result.stdout.splitlines():
+            fields = line.split()
+            if len(fields) >= 2 and len(fields[0]) == 6 and fields[0][0] in 'VAS':
+                names.add(fields[1])
+    except Exception as e:
+        logger.warning("[FFmpeg] Could not list encoders: %s", e)
+
+    _available_encoders = frozenset(names)
+    return _available_encoders
+
+
+def resolve_video_encoder(encoder: Optional[str]) -> str:
+    """Return the requested encoder when ffmpeg supports it, otherwise libx264."""
+    if not encoder or encoder == DEFAULT_VIDEO_ENCODER:
+        return DEFAULT_VIDEO_ENCODER
+    if encoder not in VIDEO_ENCODER_ARGS:
+        logger.warning("[FFmpeg] Unknown encoder %r, using %s", encoder, DEFAULT_VIDEO_ENCODER)
+        return DEFAULT_VIDEO_ENCODER
+    if encoder not in get_available_encoders():
+        logger.warning("[FFmpeg] Encoder %s not available in this ffmpeg build, using %s", encoder, DEFAULT_VIDEO_ENCODER)
+        return DEFAULT_VIDEO_ENCODER
+    if not encoder_works(encoder):
+        logger.warning("[FFmpeg] Encoder %s failed a test encode on this host, using %s", encoder, DEFAULT_VIDEO_ENCODER)
+        return DEFAULT_VIDEO_ENCODER
+    return encoder
+
+
+def encoder_works(encoder: str) -> bool:
+    """
+    Check that an encoder can actually open its device by encoding one frame.
+    
+    Hardware encoders are compiled into the image whether or not the host has
+    the GPU or driver they need; without this check a missing device fails the
+    render itself. The result is cached per encoder for the life of the process.
+    """
+    if encoder in _working_encoders:
+        return _working_encoders[encoder]
+    
+    cmd = ['ffmpeg', '-hide_banner', '-v', 'error', '-nostdin']
+    cmd.extend(build_encoder_device_args(encoder))
+    cmd.extend(['-f', 'lavfi', '-i', 'color=black:s=256x256:r=24', '-frames:v', '1'])
+    upload_filter = build_encoder_upload_filter(encoder, '[0:v]', '[enc]')
+    if upload_filter:
+        cmd.extend(['-filter_complex', upload_filter, '-map', '[enc]'])
+    cmd.extend(VIDEO_ENCODER_ARGS[encoder])
+    cmd.extend(['-f', 'null', '-'])
+    
+    try:
+        result = subprocess.run(cmd, stdin=subprocess.DEVNULL, capture_output=True, text=True, timeout=30)
+        works = result.returncode == 0
+        if not works:
+            logger.warning("[FFmpeg] Test encode with %s failed: %s", encoder, result.stderr.strip()[-500:])
+    except Exception as e:
+        logger.warning("[FFmpeg] Test encode with %s failed: %s", encoder, e)
+        works = False
+    
+    _working_encoders[encoder] = works
+    return works
+
+
+def _cgroup_cpu_limit() -> Optional[int]:
+    """Whole CPUs granted by the cgroup CPU quota (rounded up); None when unlimited or unknown."""
+    try:
+        with open(CGROUP_CPU_MAX) as f:
+            quota, period = f.read().split()[:2]
+    except (OSError, ValueError):
+        try:
+            with open(CGROUP_V1_CPU_QUOTA) as f:
+                quota = f.read().strip()
+            with open(CGROUP_V1_CPU_PERIOD) as f:
+                period = f.read().strip()
+        except OSError:
+            return None
+    try:
+        quota_us, period_us = int(quota), int(period)
+    except ValueError:
+        return None  # 'max' = no quota
+    if quota_us <= 0 or period_us <= 0:
+        return None  # -1 = no quota (cgroup v1)
+    return max(1, -(-quota_us // period_us))
+
+
+@lru_cache(maxsize=None)
+def get_cpu_count() -> int:
+    """
+    CPUs this process may run on: the affinity mask (unlike os.cpu_count), capped by
+    the cgroup CPU quota that container runtimes such as Cloud Run use to limit vCPUs.
+    """
+    if hasattr(os, 'sched_getaffinity'):
+        cpus = max(1, len(os.sched_getaffinity(0)))
+    else:
+        cpus = os.cpu_count() or 1
+    limit = _cgroup_cpu_limit()
+    return min(cpus, limit) if limit else cpus
+
+
+def build_cpu_slices(slots: int) -> List[List[int]]:
+    """
+    Split the CPUs this process may use into `slots` contiguous, disjoint groups
+    (one per parallel worker); empty when affinity is unsupported or CPUs are too few.
+    
+    Only the first get_cpu_count() CPUs of the affinity mask are sliced, so under
+    a cgroup quota each group matches the -threads each chunk is built with.
+    """
+    if not hasattr(os, 'sched_getaffinity') or slots <= 1:
+        return []
+    cpus = sorted(os.sched_getaffinity(0))[:get_cpu_count()]
+    per_slot = len(cpus) // slots
+    if per_slot < 1:
+        return []
+    return [cpus[k * per_slot:(k + 1) * per_slot] for k in range(slots)]
+
+
+def build_thread_args(threads: Optional[int] = None) -> List[str]:
+    """
+    Global thread options for the filter graphs.
+    Defaults to every available CPU; pass a smaller count when running ffmpeg processes in parallel.
+    """
+    n = threads or get_cpu_count()
+    return ['-filter_threads', str(n), '-filter_complex_threads', str(n)]
+
+
+def build_video_encoder_args(
+    encoder: str,
+    preset: str = DEFAULT_X264_PRESET,
+    threads: Optional[int] = None,
+    device_frames: bool = False,
+) -> List[str]:
+    """
+    Output options for the video encoder; preset only applies to libx264.
+    threads=None lets the encoder pick its thread count (-threads 0).
+    device_frames drops -pix_fmt, which cannot convert frames held in GPU memory.
+    """
+    args = list(VIDEO_ENCODER_ARGS[encoder])
+    if encoder == 'libx264':
+        args[2:2] = ['-preset', preset]
+    if device_frames and '-pix_fmt' in args:
+        i = args.index('-pix_fmt')
+        del args[i:i + 2]
+    args.extend(['-threads', str(threads or 0)])
+    return args
+
+
+def build_encoder_device_args(encoder: str) -> List[str]:
+    """Global options that must precede the inputs for the chosen encoder."""
+    if encoder == 'h264_vaapi':
+        return ['-vaapi_device', VAAPI_DEVICE]
+    return []
+
+
+def build_encoder_upload_filter(encoder: str, input_label: str, output_label: str) -> Optional[str]:
+    """Filter that moves finished frames to the encoder's device, if it needs one."""
+    if encoder == 'h264_vaapi':
+        return f"{input_label}format=nv12,hwupload{output_label}"
+    return None
+
+
+def build_hwaccel_input_args(hwaccel: Optional[str], keep_on_device: bool = False) -> List[str]:
+    """
+    Input options for hardware-accelerated decoding of a video input.
+    Decoded frames are copied back to system memory so the CPU filter graph still applies,
+    unless keep_on_device leaves them in GPU memory for a GPU-only graph.
+    """
+    if hwaccel in HWACCEL_METHODS:
+        if keep_on_device and hwaccel in GPU_RESIDENT_HWACCELS:
+            return ['-hwaccel', hwaccel, '-hwaccel_output_format', hwaccel]
+        return ['-hwaccel', hwaccel]
+    return []
+
+
+def build_mp4_output_args(faststart: bool = True) -> List[str]:
+    """
+    MP4 muxer options: moov atom up front for progressive playback (skipped for
+    intermediates that are only read back locally) and a muxing queue deep
+    enough for large filter graphs.
+    """
+    args = ['-max_muxing_queue_size', '9999']
+    if faststart:
+        args.extend(['-movflags', '+faststart'])
+    return args
+
+
 # Font mapping for text overlays (maps UI font names to system font names)
 FONT_MAP = {
     'Montserrat': 'Montserrat',
@@ -90,27 +420,42 @@ DEFAULT_FONT = 'DejaVu Sans'
 # Absolute path — reliable when fontconfig name resolution fails in drawtext
 DEJAVU_SANS_TTF = '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf'
 
+# drawtext filter with the options every text burn-in sets; {extra} carries the
+# optional ':key=value' suffixes (timing, fades, box, shadow) already joined
+DRAWTEXT_TEMPLATE = (
+    "{src}drawtext={font}:text='{text}':fontsize={size}:fontcolor={color}"
+    ":x={x}:y={y}{extra}{dst}"
+)
+DRAWTEXT_SHADOW = ":shadowcolor=0x00000080:shadowx=2:shadowy=2"
+
+
+# drawtext escapes, applied in one pass (% would otherwise start a text expansion)
+_DRAWTEXT_ESCAPE = str.maketrans({
+    '\\': '\\\\\\\\',
+    "'": "\\'",
+    ':': '\\:',
+    '%': '\\%',
+})
+
 
 def escape_drawtext(text: str) -> str:
     """
     Escape text for FFmpeg drawtext filter.
     Special characters need to be escaped: \\, ', :, %
     """
-    # First escape backslashes
-    text = text.replace('\\', '\\\\\\\\')
-    # Escape single quotes
-    text = text.replace("'", "\\'")
-    # Escape colons
-    text = text.replace(':', '\\:')
-    # Escape percent signs (FFmpeg uses them for timestamps)
-    text = text.replace('%', '\\%')
+    # Most captions contain none of them; substring checks are far cheaper than a rebuild
+    if '\\' in text or "'" in text or ':' in text or '%' in text:
+        return text.translate(_DRAWTEXT_ESCAPE)
     return text
 
 
+@lru_cache(maxsize=256)
 def hex_to_ffmpeg_color(hex_color: str, opacity: float = 1.0) -> str:
     """
     Convert hex color (#RRGGBB) to FFmpeg color format (0xRRGGBBAA).
     
+    Cached: overlays in one render reuse a small theme palette.
+    
     Args:
         hex_color: Color in #RRGGBB format
         opacity: Opacity from 0.0 to 1.0
@@ -121,6 +466,10 @@ def hex_to_ffmpeg_color(hex_color: str, opacity: float = 1.0) -> str:
     # Remove # if present
     hex_color = hex_color.lstrip('#')
     
+    # Opaque (the usual text case) needs no alpha arithmetic
+    if opacity >= 1.0:
+        return f'0x{hex_color}FF'
+    
     # Convert opacity to hex (00-FF)
     alpha = int(opacity * 255)
     alpha_hex = f'{alpha:02X}'
@@ -128,6 +477,36 @@ def hex_to_ffmpeg_color(hex_color: str, opacity: float = 1.0) -> str:
     return f'0x{hex_color}{alpha_hex}'
 
 
+# CSS font weight -> file name suffix
+FONT_WEIGHT_SUFFIXES = {
+    100: 'Thin',
+    200: 'ExtraLight',
+    300: 'Light',
+    400: 'Regular',
+    500: 'Medium',
+    600: 'SemiBold',
+    700: 'Bold',
+    800: 'ExtraBold',
+    900: 'Black',
+}
+
+# Font directories installed in the image
+FONT_DIRS = {
+    'Montserrat': '/usr/share/fonts/google/montserrat',
+    'Roboto': '/usr/share/fonts/google/roboto',
+    'RobotoMono': '/usr/share/fonts/google/robotomono',
+    'Lora': '/usr/share/fonts/liberation2',  # Lora falls back to Liberation Serif
+}
+
+# Font file base names (in case of fallbacks)
+FONT_FILE_NAMES = {
+    'Montserrat': 'Montserrat',
+    'Roboto': 'Roboto',
+    'RobotoMono': 'RobotoMono',
+    'Lora': 'LiberationSerif',  # Fallback for Lora
+}
+
+
 def get_font_file(font_family: str, font_weight: int = 400) -> str:
     """
     Get the path to a font file based on family and weight.
@@ -137,48 +516,39 @@ def get_font_file(font_family: str, font_weight: int = 400) -> str:
         font_weight: Font weight (100-900)
     
     Returns:
-        Path to the font file
-    """
-    # Determine weight suffix based on weight value
-    weight_suffixes = {
-        100: 'Thin',
-        200: 'ExtraLight',
-        300: 'Light',
-        400: 'Regular',
-        500: 'Medium',
-        600: 'SemiBold',
-        700: 'Bold',
-        800: 'ExtraBold',
-        900: 'Black',
-    }
-    
-    # Find closest weight
-    closest_weight = min(weight_suffixes.keys(), key=lambda x: abs(x - font_weight))
-    weight_name = weight_suffixes[closest_weight]
-    
-    # Build font file path
-    font_dir_map = {
-        'Montserrat': '/usr/share/fonts/google/montserrat',
-        'Roboto': '/usr/share/fonts/google/roboto',
-        'RobotoMono': '/usr/share/fonts/google/robotomono',
-        'Lora': '/usr/share/fonts/liberation2',  # Lora falls back to Liberation Serif
-    }
+        Path to the font file (or a fontconfig name when no file is installed)
+    """
+    return resolve_font(font_family, font_weight)[0]
+
+
+def resolve_font(font_family: str, font_weight: int = 400) -> Tuple[str, bool]:
+    """
+    Resolve a font for drawtext, with whether it is a file on disk.
     
-    # Font name mapping (in case of fallbacks)
-    font_name_map = {
-        'Montserrat': 'Montserrat',
-        'Roboto': 'Roboto',
-        'RobotoMono': 'RobotoMono',
-        'Lora': 'LiberationSerif',  # Fallback for Lora
-    }
+    Args:
+        font_family: Font family name (Montserrat, Roboto, etc.)
+        font_weight: Font weight (100-900)
     
-    font_dir = font_dir_map.get(font_family, '')
-    font_base_name = font_name_map.get(font_family, font_family)
+    Returns:
+        (font, is_file): a font file path for fontfile= when is_file is True,
+        otherwise a fontconfig name for font=
+    """
+    # Find closest weight
+    closest_weight = min(FONT_WEIGHT_SUFFIXES.keys(), key=lambda x: abs(x - font_weight))
+    return _resolve_font(font_family, closest_weight)
+
+
+@lru_cache(maxsize=128)
+def _resolve_font(font_family: str, weight: int) -> Tuple[str, bool]:
+    """Probe the font files for a family/weight once; fallbacks are cached too."""
+    weight_name = FONT_WEIGHT_SUFFIXES[weight]
+    font_dir = FONT_DIRS.get(font_family, '')
+    font_base_name = FONT_FILE_NAMES.get(font_family, font_family)
     
     if not font_dir:
         if os.path.exists(DEJAVU_SANS_TTF):
-            return DEJAVU_SANS_TTF
-        return DEFAULT_FONT
+            return DEJAVU_SANS_TTF, True
+        return DEFAULT_FONT, False
     
     # Try to find the font file with the right weight
     # Google Fonts use naming like: Montserrat-Bold.ttf, Roboto-Medium.ttf
@@ -188,23 +558,81 @@ def get_font_file(font_family: str, font_weight: int = 400) -> str:
     static_font_file = os.path.join(font_dir, 'static', f'{font_base_name}-{weight_name}.ttf')
     
     if os.path.exists(static_font_file):
-        return static_font_file
+        return static_font_file, True
     elif os.path.exists(font_file):
-        return font_file
+        return font_file, True
     else:
         # Try with just the family name + Regular
         regular_file = os.path.join(font_dir, f'{font_base_name}-Regular.ttf')
         static_regular = os.path.join(font_dir, 'static', f'{font_base_name}-Regular.ttf')
         
         if os.path.exists(static_regular):
-            return static_regular
+            return static_regular, True
         elif os.path.exists(regular_file):
-            return regular_file
+            return regular_file, True
         else:
-            print(f"[FFmpeg] Warning: Font file not found for {font_family}-{weight_name}, falling back")
+            logger.warning("[FFmpeg] Font file not found for %s-%s, falling back", font_family, weight_name)
             if os.path.exists(DEJAVU_SANS_TTF):
-                return DEJAVU_SANS_TTF
-            return FONT_MAP.get(font_family, DEFAULT_FONT)
+                return DEJAVU_SANS_TTF, True
+            return FONT_MAP.get(font_family, DEFAULT_FONT), False
+
+
+@lru_cache(maxsize=1024, typed=True)
+def build_drawtext_timing_exprs(
+    start_time: float,
+    duration: float,
+    fade_in_ms: float,
+    fade_out_ms: float,
+) -> tuple:
+    """
+    Build the drawtext enable and alpha expressions for an overlay's timing.
+    
+    Memoized: subtitle decks repeat the same durations and fades across many
+    overlays, so each distinct timing is formatted once.
+    
+    Args:
+        start_time: Overlay start in seconds
+        duration: Seconds on screen (-1 or 0 = until the end of the video)
+        fade_in_ms: Fade-in length in milliseconds
+        fade_out_ms: Fade-out length in milliseconds (needs a positive duration)
+    
+    Returns:
+        (enable_expr, alpha_expr); alpha_expr is "1" without fades
+    """
+    # Build enable expression for timing
+    if duration > 0:
+        end_time = start_time + duration
+        enable_expr = f"between(t,{start_time},{end_time})"
+    else:
+        enable_expr = f"gte(t,{start_time})"
+    
+    # Build alpha expression for fade effects
+    fade_in_sec = fade_in_ms / 1000.0
+    fade_out_sec = fade_out_ms / 1000.0
+    
+    if fade_in_sec > 0 or fade_out_sec > 0:
+        alpha_parts = []
+        
+        if fade_in_sec > 0:
+            # Fade in: from 0 to 1 over fade_in duration
+            alpha_parts.append(f"if(lt(t,{start_time + fade_in_sec}),(t-{start_time})/{fade_in_sec},1)")
+        
+        if fade_out_sec > 0 and duration > 0:
+            end_time = start_time + duration
+            fade_out_start = end_time - fade_out_sec
+            # Fade out: from 1 to 0 over fade_out duration
+            alpha_parts.append(f"if(gt(t,{fade_out_start}),({end_time}-t)/{fade_out_sec},1)")
+        
+        if len(alpha_parts) == 2:
+            alpha_expr = f"min({alpha_parts[0]},{alpha_parts[1]})"
+        elif len(alpha_parts) == 1:
+            alpha_expr = alpha_parts[0]
+        else:
+            alpha_expr = "1"
+    else:
+        alpha_expr = "1"
+    
+    return enable_expr, alpha_expr
 
 
 def build_drawtext_filter(
@@ -245,7 +673,7 @@ def build_drawtext_filter(
     subtext = overlay.get('subtext', '')
     
     # Get font file path
-    font_file = get_font_file(font_family, font_weight)
+    font_file, font_is_file = resolve_font(font_family, font_weight)
     
     # Convert hex color to FFmpeg format
     fontcolor = hex_to_ffmpeg_color(color)
@@ -274,75 +702,35 @@ def build_drawtext_filter(
         x_expr = str(x)
         y_expr = str(y)
     
-    # Build enable expression for timing
-    if duration > 0:
-        end_time = start_time + duration
-        enable_expr = f"between(t,{start_time},{end_time})"
-    else:
-        enable_expr = f"gte(t,{start_time})"
-    
-    # Build alpha expression for fade effects
-    fade_in_sec = fade_in_ms / 1000.0
-    fade_out_sec = fade_out_ms / 1000.0
-    
-    if fade_in_sec > 0 or fade_out_sec > 0:
-        alpha_parts = []
-        
-        if fade_in_sec > 0:
-            # Fade in: from 0 to 1 over fade_in duration
-            alpha_parts.append(f"if(lt(t,{start_time + fade_in_sec}),(t-{start_time})/{fade_in_sec},1)")
-        
-        if fade_out_sec > 0 and duration > 0:
-            end_time = start_time + duration
-            fade_out_start = end_time - fade_out_sec
-            # Fade out: from 1 to 0 over fade_out duration
-            alpha_parts.append(f"if(gt(t,{fade_out_start}),({end_time}-t)/{fade_out_sec},1)")
-        
-        if len(alpha_parts) == 2:
-            alpha_expr = f"min({alpha_parts[0]},{alpha_parts[1]})"
-        elif len(alpha_parts) == 1:
-            alpha_expr = alpha_parts[0]
-        else:
-            alpha_expr = "1"
-    else:
-        alpha_expr = "1"
+    enable_expr, alpha_expr = build_drawtext_timing_exprs(start_time, duration, fade_in_ms, fade_out_ms)
     
-    # Build drawtext filter parts
-    filter_parts = [
-        f"fontfile='{font_file}'" if os.path.exists(font_file) else f"font='{font_file}'",
-        f"text='{text}'",
-        f"fontsize={font_size}",
-        f"fontcolor={fontcolor}",
-        f"x={x_expr}",
-        f"y={y_expr}",
-        f"enable='{enable_expr}'",
-    ]
+    # Optional options, preformatted with their ':' separators
+    extra = [f":enable='{enable_expr}'"]
     
     # Add alpha for fades
     if alpha_expr != "1":
-        filter_parts.append(f"alpha='{alpha_expr}'")
+        extra.append(f":alpha='{alpha_expr}'")
     
     # Add background box if specified
     if bg_color:
         box_color = hex_to_ffmpeg_color(bg_color, bg_opacity)
-        filter_parts.extend([
-            "box=1",
-            f"boxcolor={box_color}",
-            "boxborderw=10",
-        ])
+        extra.append(f":box=1:boxcolor={box_color}:boxborderw=10")
     
     # Add text shadow
     if text_shadow:
-        filter_parts.extend([
-            "shadowcolor=0x00000080",
-            "shadowx=2",
-            "shadowy=2",
-        ])
-    
-    # Build the filter string
-    filter_str = f"{input_label}drawtext={':'.join(filter_parts)}{output_label}"
-    
-    return filter_str
+        extra.append(DRAWTEXT_SHADOW)
+    
+    return DRAWTEXT_TEMPLATE.format(
+        src=input_label,
+        font=f"fontfile='{font_file}'" if font_is_file else f"font='{font_file}'",
+        text=text,
+        size=font_size,
+        color=fontcolor,
+        x=x_expr,
+        y=y_expr,
+        extra=''.join(extra),
+        dst=output_label,
+    )
 
 
 def build_text_overlay_filters(
@@ -355,6 +743,9 @@ def build_text_overlay_filters(
     """
     Build FFmpeg filter chain for multiple text overlays.
     
+    The drawtext filters are joined into one comma-separated chain, so the
+    graph gets a single labeled link instead of one per overlay.
+    
     Args:
         text_overlays: List of text overlay specifications
         input_label: Input stream label (e.g., "[outv]")
@@ -363,29 +754,24 @@ def build_text_overlay_filters(
         height: Video height in pixels
     
     Returns:
-        List of FFmpeg filter strings to chain together
+        List of FFmpeg filter strings to chain together (a single chain, or empty)
     """
-    if not text_overlays:
+    chain = build_text_overlay_chain(text_overlays, width, height)
+    if not chain:
         return []
-    
-    filters = []
-    current_label = input_label
-    
-    for i, overlay in enumerate(text_overlays):
-        is_last = (i == len(text_overlays) - 1)
-        next_label = output_label if is_last else f"[text{i}]"
-        
-        filter_str = build_drawtext_filter(
-            overlay=overlay,
-            input_label=current_label,
-            output_label=next_label,
-            width=width,
-            height=height,
-        )
-        filters.append(filter_str)
-        current_label = next_label
-    
-    return filters
+    return [f"{input_label}{','.join(chain)}{output_label}"]
+
+
+def build_text_overlay_chain(
+    text_overlays: List[Dict[str, Any]],
+    width: int = 1920,
+    height: int = 1080,
+) -> List[str]:
+    """Unlabeled drawtext filters for the text overlays, in drawing order."""
+    return [
+        build_drawtext_filter(overlay, '', '', width=width, height=height)
+        for overlay in text_overlays or []
+    ]
 
 
 def build_watermark_text_filter(
@@ -419,7 +805,7 @@ def build_watermark_text_filter(
     text_shadow = text_style.get('textShadow', True)
     
     # Get font file path
-    font_file = get_font_file(font_family, font_weight)
+    font_file, font_is_file = resolve_font(font_family, font_weight)
     
     # Same as text overlays: bundled alpha in fontcolor via hex_to_ffmpeg_color (requires explicit fontfile when possible).
     color_hex = str(color).lstrip('#')
@@ -450,29 +836,22 @@ def build_watermark_text_filter(
         x_expr = f'w-tw-{padding}'
         y_expr = f'h-th-{padding}'
     
-    # Build drawtext filter parts (match text overlays: no fix_bounds — some FFmpeg builds
-    # mis-handle fix_bounds with labeled filter_complex chains, which can drop the watermark)
-    filter_parts = [
-        f"fontfile='{font_file}'" if os.path.exists(font_file) else f"font='{font_file}'",
-        f"text='{text}'",
-        f"fontsize={font_size}",
-        f"fontcolor={fontcolor}",
-        f"x={x_expr}",
-        f"y={y_expr}",
-    ]
-    
-    # Add text shadow for better visibility
-    if text_shadow:
-        filter_parts.extend([
-            "shadowcolor=0x00000080",
-            "shadowx=2",
-            "shadowy=2",
-        ])
-    
-    # Build the filter string
-    filter_str = f"{input_label}drawtext={':'.join(filter_parts)}{output_label}"
+    # Same drawtext options as text overlays (no fix_bounds — some FFmpeg builds
+    # mis-handle fix_bounds with labeled filter_complex chains, which can drop the watermark);
+    # text shadow for better visibility
+    filter_str = DRAWTEXT_TEMPLATE.format(
+        src=input_label,
+        font=f"fontfile='{font_file}'" if font_is_file else f"font='{font_file}'",
+        text=text,
+        size=font_size,
+        color=fontcolor,
+        x=x_expr,
+        y=y_expr,
+        extra=DRAWTEXT_SHADOW if text_shadow else '',
+        dst=output_label,
+    )
     
-    print(f"[FFmpeg] Watermark text filter: text='{str(raw_text)[:30]}', anchor={anchor}, fontSize={font_size}")
+    logger.info("[FFmpeg] Watermark text filter: text='%s', anchor=%s, fontSize=%s", str(raw_text)[:30], anchor, font_size)
     
     return filter_str
 
@@ -537,10 +916,30 @@ def rect_to_zoompan_xy(
     return zoom, px, py
 
 
+@lru_cache(maxsize=None)
+def ken_burns_geometry(width: int, height: int) -> tuple:
+    """
+    Per-resolution Ken Burns canvas values, computed once per output size.
+    
+    Returns:
+        (scaled_w, scaled_h, center_x, center_y, pan_headroom_x, pan_headroom_y):
+        the SCALE_FACTOR headroom canvas, the viewport origin that centers an
+        output-sized window on it, and the pan distance for panX/panY = ±1
+    """
+    scaled_w = width * SCALE_FACTOR
+    scaled_h = height * SCALE_FACTOR
+    # Pan distance over the duration (as percentage of available headroom)
+    pan_headroom_x = (scaled_w - width) / 2
+    pan_headroom_y = (scaled_h - height) / 2
+    center_x = (scaled_w - width) / 2
+    center_y = (scaled_h - height) / 2
+    return scaled_w, scaled_h, center_x, center_y, pan_headroom_x, pan_headroom_y
+
+
 def build_ken_burns_filter(
     segment_index: int,
     duration_frames: int,
-    fps: int,
+    fps: FrameRate,
     zoom_start: float = 1.0,
     zoom_end: float = 1.1,
     pan_x: float = 0.0,
@@ -567,64 +966,288 @@ def build_ken_burns_filter(
     Returns:
         FFmpeg filter string for this segment
     """
-    scaled_w = width * SCALE_FACTOR
-    scaled_h = height * SCALE_FACTOR
+    # Rect dicts become sorted item tuples so the arguments are hashable for the cache
+    body = _cached_ken_burns_body(
+        duration_frames, fps, zoom_start, zoom_end, pan_x, pan_y,
+        width, height,
+        tuple(sorted(start_rect.items())) if start_rect else None,
+        tuple(sorted(end_rect.items())) if end_rect else None,
+    )
+    return f"[{segment_index}:v]{body}[v{segment_index}]"
+
+
+@lru_cache(maxsize=4096, typed=True)
+def _cached_ken_burns_body(
+    duration_frames: int,
+    fps: FrameRate,
+    zoom_start: float,
+    zoom_end: float,
+    pan_x: float,
+    pan_y: float,
+    width: int,
+    height: int,
+    start_rect: Optional[tuple],
+    end_rect: Optional[tuple],
+) -> str:
+    """Unlabeled build_ken_burns_filter body, memoized (presets repeat across segments, previews and retries)."""
+    scaled_w, scaled_h, center_x, center_y, pan_headroom_x, pan_headroom_y = ken_burns_geometry(width, height)
 
     if start_rect and end_rect:
-        z0, x0, y0 = rect_to_zoompan_xy(start_rect, scaled_w, scaled_h)
-        z1, x1, y1 = rect_to_zoompan_xy(end_rect, scaled_w, scaled_h)
-        if duration_frames > 0:
-            zoom_expr = f"'{z0}+({z1}-{z0})*on/{duration_frames}'"
-            x_expr = f"'{x0}+({x1}-{x0})*on/{duration_frames}'"
-            y_expr = f"'{y0}+({y1}-{y0})*on/{duration_frames}'"
-        else:
-            zoom_expr = f"'{z0}'"
-            x_expr = f"'{x0}'"
-            y_expr = f"'{y0}'"
+        z0, x0, y0 = rect_to_zoompan_xy(dict(start_rect), scaled_w, scaled_h)
+        z1, x1, y1 = rect_to_zoompan_xy(dict(end_rect), scaled_w, scaled_h)
     else:
-        # Calculate zoom rate per frame
-        zoom_diff = zoom_end - zoom_start
-        zoom_rate = zoom_diff / duration_frames if duration_frames > 0 else 0
-        
-        # Zoompan expression for zoom
-        zoom_expr = f"'{zoom_start}+{zoom_rate}*on'"
-        
-        # Pan distance over the duration (as percentage of available headroom)
-        pan_headroom_x = (scaled_w - width) / 2
-        pan_headroom_y = (scaled_h - height) / 2
-        
-        pan_per_frame_x = (pan_x * pan_headroom_x) / duration_frames if duration_frames > 0 else 0
-        pan_per_frame_y = (pan_y * pan_headroom_y) / duration_frames if duration_frames > 0 else 0
-        
-        center_x = (scaled_w - width) / 2
-        center_y = (scaled_h - height) / 2
-        
-        x_expr = f"'{center_x}+{pan_per_frame_x}*on'"
-        y_expr = f"'{center_y}+{pan_per_frame_y}*on'"
+        z0, x0, y0 = zoom_start, center_x, center_y
+        z1 = zoom_end
+        x1 = center_x + pan_x * pan_headroom_x
+        y1 = center_y + pan_y * pan_headroom_y
+    
+    if duration_frames <= 0:
+        z1, x1, y1 = z0, x0, y0
+    
+    # Constant zoom: a moving crop over a pre-scaled still replaces zoompan's per-frame rescale
+    if z0 == z1:
+        return _crop_pan_body(duration_frames, fps, z0, x0, y0, x1, y1, width, height)
+    
+    # Linear trajectories with the per-frame rate folded to a constant;
+    # axes that do not move are emitted as plain numbers
+    zoom_expr = _linear_frame_expr(z0, z1, duration_frames, 'on')
+    x_expr = _linear_frame_expr(x0, x1, duration_frames, 'on')
+    y_expr = _linear_frame_expr(y0, y1, duration_frames, 'on')
     
     # Build the zoompan filter
-    # First scale to 2x for headroom, then apply zoompan
-    filter_str = (
-        f"[{segment_index}:v]"
-        f"scale={scaled_w}:{scaled_h}:force_original_aspect_ratio=increase,"
-        f"crop={scaled_w}:{scaled_h},"
-        f"zoompan=z={zoom_expr}:x={x_expr}:y={y_expr}:d={duration_frames}:s={width}x{height}:fps={fps}"
-        f"[v{segment_index}]"
+    # First scale to 2x for headroom, then apply zoompan (the input is a single
+    # still frame, so the upscale runs once and zoompan emits all d frames from it)
+    return KB_TEMPLATE.format(
+        sw=scaled_w, sh=scaled_h,
+        z=zoom_expr, x=x_expr, y=y_expr,
+        d=duration_frames, w=width, h=height, fps=fps,
     )
-    
-    return filter_str
 
 
-def build_ffmpeg_command(
-    segments: List[Dict[str, Any]],
-    audio_clips: List[Dict[str, Any]],
-    output_path: str,
-    resolution: str = '1080p',
-    fps: int = 24,
+def _linear_frame_expr(start: float, end: float, duration_frames: int, var: str) -> str:
+    """Expression moving from start to end over duration_frames in frame variable var (constant when equal)."""
+    if start == end:
+        return f"'{start}'"
+    return f"'{start}+{(end - start) / duration_frames}*{var}'"
+
+
+def build_crop_pan_filter(
+    segment_index: int,
+    duration_frames: int,
+    fps: FrameRate,
+    zoom: float,
+    x0: float,
+    y0: float,
+    x1: float,
+    y1: float,
+    width: int = 1920,
+    height: int = 1080,
+) -> str:
+    """
+    Build the filter for a segment with constant zoom (pan only, or no motion).
+    
+    The still is scaled once so an output-sized crop covers the same viewport
+    zoompan would show on the 2x headroom canvas; the crop window then moves
+    linearly (crop clamps x/y to the frame just as zoompan does). Without
+    motion the crop is applied once, before the frame is repeated.
+    
+    Args:
+        segment_index: Index of this segment (for input reference)
+        duration_frames: Number of frames for this segment
+        fps: Output frames per second
+        zoom: Zoom level (1.0 = whole canvas)
+        x0, y0: Viewport origin on the 2x canvas at the first frame
+        x1, y1: Viewport origin on the 2x canvas at the last frame
+        width: Output width
+        height: Output height
+    
+    Returns:
+        FFmpeg filter string for this segment
+    """
+    body = _crop_pan_body(duration_frames, fps, zoom, x0, y0, x1, y1, width, height)
+    return f"[{segment_index}:v]{body}[v{segment_index}]"
+
+
+def _crop_pan_body(
+    duration_frames: int,
+    fps: FrameRate,
+    zoom: float,
+    x0: float,
+    y0: float,
+    x1: float,
+    y1: float,
+    width: int,
+    height: int,
+) -> str:
+    """Unlabeled build_crop_pan_filter body."""
+    scaled_w, scaled_h = ken_burns_geometry(width, height)[:2]
+    zoom = max(1.0, min(10.0, zoom))
+    
+    canvas_w = max(width, round(width * zoom))
+    canvas_h = max(height, round(height * zoom))
+    kx = canvas_w / scaled_w
+    ky = canvas_h / scaled_h
+    crop = VIEWPORT_CROP_TEMPLATE.format(
+        w=width, h=height,
+        x=_linear_frame_expr(x0 * kx, x1 * kx, duration_frames, 'n'),
+        y=_linear_frame_expr(y0 * ky, y1 * ky, duration_frames, 'n'),
+    )
+    hold = HOLD_TEMPLATE.format(loops=max(0, duration_frames - 1), fps=fps)
+    moving = (x0, y0) != (x1, y1)
+    
+    return CROP_PAN_TEMPLATE.format(
+        cw=canvas_w, ch=canvas_h,
+        motion=f"{hold},{crop}" if moving else f"{crop},{hold}",
+    )
+
+
+def build_audio_clip_filter(clip: Dict[str, Any], input_idx: int, output_label: str) -> str:
+    """
+    Time-stretch, level and place one overlay audio clip into a mixable stream.
+    
+    The clip is shifted to startTime (output timeline seconds) by timestamp
+    rather than adelay; aresample then fills the lead-in with silence at the
+    exact sample position so amix sees a stream starting at zero.
+    """
+    start_time = float(clip.get('startTime', 0) or 0)
+    volume = clip.get('volume', 1.0)
+    pr = clip.get('playbackRate', 1.0) or 1.0
+    tempo = build_atempo_filter_chain(float(pr))
+    chain = []
+    if tempo:
+        chain.append(tempo)
+    chain.append(f"volume={volume}")
+    chain.append("aformat=sample_fmts=fltp:sample_rates=48000:channel_layouts=stereo")
+    if start_time > 0:
+        chain.append(f"asetpts=PTS-STARTPTS+{start_time}/TB")
+        chain.append("aresample=async=1:first_pts=0")
+    else:
+        chain.append("asetpts=PTS-STARTPTS")
+    return f"[{input_idx}:a]{','.join(chain)}{output_label}"
+
+
+def build_audio_mix_filters(
+    audio_clips: List[Dict[str, Any]],
+    audio_inputs_start: int,
+) -> tuple:
+    """
+    Build the filters that place and mix overlay audio clips.
+    
+    Args:
+        audio_clips: Audio clips with timing, volume and playback rate
+        audio_inputs_start: Input index of the first clip
+    
+    Returns:
+        (filter_parts, output_label); output_label is None without clips
+    """
+    if not audio_clips:
+        return [], None
+    
+    filter_parts = []
+    audio_mix_inputs = []
+    for i, clip in enumerate(audio_clips):
+        filter_parts.append(build_audio_clip_filter(clip, audio_inputs_start + i, f"[a{i}]"))
+        audio_mix_inputs.append(f"[a{i}]")
+    
+    # Mix all audio tracks
+    if len(audio_mix_inputs) > 1:
+        mix_filter = f"{''.join(audio_mix_inputs)}amix=inputs={len(audio_clips)}:duration=longest:normalize=0:dropout_transition=0[outa]"
+        filter_parts.append(mix_filter)
+        return filter_parts, "[outa]"
+    return filter_parts, "[a0]"
+
+
+def assets_prefix(temp_dir: str) -> str:
+    """Downloaded-assets directory with a trailing separator; asset file names are appended directly."""
+    return os.path.join(temp_dir, 'assets', '')
+
+
+def is_remote_input(path: str) -> bool:
+    """True for an http(s) URL that FFmpeg streams itself rather than a downloaded file."""
+    return path.startswith(REMOTE_INPUT_PREFIXES)
+
+
+def asset_input_path(assets: str, local_file: str) -> str:
+    """Input path for an asset: the file under the assets prefix, or a remote URL unchanged."""
+    return local_file if is_remote_input(local_file) else assets + local_file
+
+
+def build_concat_list_input_args(list_path: str, remote: bool = False) -> List[str]:
+    """Concat demuxer input args; remote lists also allow the network protocols."""
+    args = ['-protocol_whitelist', REMOTE_CONCAT_PROTOCOLS] if remote else []
+    return args + ['-f', 'concat', '-safe', '0', '-i', list_path]
+
+
+def intermediate_output_path(output_path: str) -> str:
+    """Path an intermediate render is written to (same name, MKV container)."""
+    return os.path.splitext(output_path)[0] + INTERMEDIATE_EXTENSION
+
+
+def build_ffmpeg_command(
+    segments: List[Dict[str, Any]],
+    audio_clips: List[Dict[str, Any]],
+    output_path: str,
+    resolution: str = '1080p',
+    fps: FrameRate = 24,
+    temp_dir: str = '/tmp',
+    encoder: str = DEFAULT_VIDEO_ENCODER,
+    preset: str = DEFAULT_X264_PRESET,
+    threads: Optional[int] = None,
+    max_segments_per_pass: int = MAX_SEGMENTS_PER_PASS,
+    intermediate: bool = False,
+) -> List[List[str]]:
+    """
+    Build the FFmpeg commands for a Ken Burns render, run in order.
+    
+    Timelines longer than max_segments_per_pass are rendered in groups (one
+    intermediate MP4 per group) followed by a stitch command, keeping every
+    filter graph small.
+    
+    Args:
+        segments: List of video segments with image paths and Ken Burns settings
+        audio_clips: List of audio clips with paths and timing
+        output_path: Path for output MP4 file
+        resolution: Output resolution ('720p', '1080p', '4K')
+        fps: Output frames per second
+        temp_dir: Directory containing downloaded assets
+        encoder: Video encoder (libx264 or a hardware encoder from VIDEO_ENCODER_ARGS)
+        preset: libx264 speed preset
+        threads: Filter and encoder thread count (None = all available CPUs)
+        max_segments_per_pass: Maximum segments in one filter graph
+        intermediate: Write a near-lossless MKV (see intermediate_output_path) for a
+            later build_concat_ffmpeg_command to encode once
+    
+    Returns:
+        List of FFmpeg commands (each a list of arguments)
+    """
+    if len(segments) <= max_segments_per_pass:
+        return [build_single_pass_command(
+            segments, audio_clips, output_path, resolution, fps, temp_dir,
+            encoder=encoder, preset=preset, threads=threads, intermediate=intermediate,
+        )]
+    chunk_cmds, stitch_cmd = build_chunked_commands(
+        segments, audio_clips, output_path, resolution, fps, temp_dir,
+        chunk_size=max_segments_per_pass, parallelism=1,
+        encoder=encoder, preset=preset, threads=threads, intermediate=intermediate,
+    )
+    return chunk_cmds + ([stitch_cmd] if stitch_cmd else [])
+
+
+def build_single_pass_command(
+    segments: List[Dict[str, Any]],
+    audio_clips: List[Dict[str, Any]],
+    output_path: str,
+    resolution: str = '1080p',
+    fps: FrameRate = 24,
     temp_dir: str = '/tmp',
+    encoder: str = DEFAULT_VIDEO_ENCODER,
+    preset: str = DEFAULT_X264_PRESET,
+    threads: Optional[int] = None,
+    faststart: bool = True,
+    intermediate: bool = False,
 ) -> List[str]:
     """
-    Build complete FFmpeg command for video rendering.
+    Build complete FFmpeg command for video rendering in a single filter graph.
     
     Args:
         segments: List of video segments with image paths and Ken Burns settings
@@ -633,182 +1256,1268 @@ def build_ffmpeg_command(
         resolution: Output resolution ('720p', '1080p', '4K')
         fps: Output frames per second
         temp_dir: Directory containing downloaded assets
+        encoder: Video encoder (libx264 or a hardware encoder from VIDEO_ENCODER_ARGS)
+        preset: libx264 speed preset
+        threads: Filter and encoder thread count (None = all available CPUs)
+        faststart: Move the moov atom to the front (off for chunk intermediates)
+        intermediate: Near-lossless all-intra video and FLAC audio in an MKV written
+            to intermediate_output_path(output_path)
     
     Returns:
         FFmpeg command as list of arguments
     """
-    res = RESOLUTIONS.get(resolution, RESOLUTIONS['1080p'])
-    width, height = res['width'], res['height']
-    
-    cmd = ['ffmpeg', '-y']  # -y = overwrite output
+    encoder = 'libx264' if intermediate else resolve_video_encoder(encoder)
+    build = compile_pipeline(
+        resolution, fps, len(segments), len(audio_clips),
+        encoder=encoder, preset=preset, threads=threads,
+        faststart=faststart, intermediate=intermediate,
+    )
+    return build(segments, audio_clips, output_path, temp_dir)
+
+
+def _segment_ken_burns_filter(
+    index: int,
+    segment: Dict[str, Any],
+    fps: FrameRate,
+    width: int,
+    height: int,
+) -> str:
+    """Ken Burns filter for one image segment, from its duration and kenBurns settings."""
+    duration = segment.get('duration', 5)
+    kb = segment.get('kenBurns', {})
+    return build_ken_burns_filter(
+        segment_index=index,
+        duration_frames=int(duration * fps),
+        fps=fps,
+        zoom_start=kb.get('zoomStart', 1.0),
+        zoom_end=kb.get('zoomEnd', 1.05),
+        pan_x=kb.get('panX', 0.0),
+        pan_y=kb.get('panY', 0.0),
+        width=width,
+        height=height,
+        start_rect=kb.get('startRect'),
+        end_rect=kb.get('endRect'),
+    )
+
+
+@lru_cache(maxsize=64, typed=True)
+def compile_pipeline(
+    resolution: str,
+    fps: FrameRate,
+    n_segments: int,
+    n_audio: int,
+    encoder: str = DEFAULT_VIDEO_ENCODER,
+    preset: str = DEFAULT_X264_PRESET,
+    threads: Optional[int] = None,
+    faststart: bool = True,
+    intermediate: bool = False,
+) -> Callable[..., List[str]]:
+    """
+    Specialize the single-pass Ken Burns command for one render shape.
     
-    # Add input files (images)
-    for i, segment in enumerate(segments):
-        image_path = os.path.join(temp_dir, 'assets', segment['localFile'])
-        cmd.extend(['-loop', '1', '-i', image_path])
+    Everything that depends only on the shape (global options, concat and amix
+    filters, stream maps, codec and muxer options) is built once; the returned
+    builder(segments, audio_clips, output_path, temp_dir='/tmp') only adds the
+    input paths, per-segment/per-clip filters and the duration. The most recent
+    64 shapes are cached, so renders with a repeating layout skip the setup.
     
-    # Add audio input files
-    audio_inputs_start = len(segments)
-    for i, clip in enumerate(audio_clips):
-        audio_path = os.path.join(temp_dir, 'assets', clip['localFile'])
-        cmd.extend(['-i', audio_path])
+    Args:
+        resolution: Output resolution ('720p', '1080p', '4K')
+        fps: Output frames per second
+        n_segments: Number of image segments
+        n_audio: Number of audio clips
+        encoder: Video encoder, already resolved (see resolve_video_encoder)
+        preset: libx264 speed preset
+        threads: Filter and encoder thread count (None = all available CPUs)
+        faststart: Move the moov atom to the front
+        intermediate: Near-lossless all-intra video and FLAC audio in an MKV
     
-    # Build filter complex
-    filter_parts = []
-    video_concat_inputs = []
+    Returns:
+        Command builder for renders of this shape
+    """
+    width, height = resolve_resolution(resolution)
     
-    # Video filters with Ken Burns
-    for i, segment in enumerate(segments):
-        duration = segment.get('duration', 5)
-        duration_frames = int(duration * fps)
-        
-        # Ken Burns settings
-        kb = segment.get('kenBurns', {})
-        zoom_start = kb.get('zoomStart', 1.0)
-        zoom_end = kb.get('zoomEnd', 1.05)
-        pan_x = kb.get('panX', 0.0)
-        pan_y = kb.get('panY', 0.0)
-        start_rect = kb.get('startRect')
-        end_rect = kb.get('endRect')
-        
-        filter_str = build_ken_burns_filter(
-            segment_index=i,
-            duration_frames=duration_frames,
-            fps=fps,
-            zoom_start=zoom_start,
-            zoom_end=zoom_end,
-            pan_x=pan_x,
-            pan_y=pan_y,
-            width=width,
-            height=height,
-            start_rect=start_rect,
-            end_rect=end_rect,
-        )
-        filter_parts.append(filter_str)
-        video_concat_inputs.append(f"[v{i}]")
+    head = ['ffmpeg', '-y']  # -y = overwrite output
+    head.extend(build_thread_args(threads))
+    head.extend(build_encoder_device_args(encoder))
     
     # Concatenate all video segments
-    if len(video_concat_inputs) > 1:
-        concat_filter = f"{''.join(video_concat_inputs)}concat=n={len(segments)}:v=1:a=0[outv]"
-        filter_parts.append(concat_filter)
+    video_tail = []
+    if n_segments > 1:
+        concat_inputs = ''.join(f"[v{i}]" for i in range(n_segments))
+        video_tail.append(f"{concat_inputs}concat=n={n_segments}:v=1:a=0[outv]")
         video_output = "[outv]"
     else:
         video_output = "[v0]"
     
-    # Audio mixing (if we have audio clips)
-    if audio_clips:
-        # Build audio mix with proper timing using adelay
-        audio_mix_inputs = []
+    upload_filter = build_encoder_upload_filter(encoder, video_output, "[hwv]")
+    if upload_filter:
+        video_tail.append(upload_filter)
+        video_output = "[hwv]"
+    
+    # Audio mixing (if we have audio clips); per-clip chains are added per render
+    audio_inputs_start = n_segments
+    audio_tail = []
+    audio_output = None
+    if n_audio > 1:
+        mix_inputs = ''.join(f"[a{i}]" for i in range(n_audio))
+        audio_tail.append(f"{mix_inputs}amix=inputs={n_audio}:duration=longest:normalize=0:dropout_transition=0[outa]")
+        audio_output = "[outa]"
+    elif n_audio == 1:
+        audio_output = "[a0]"
+    
+    # Map outputs and output settings
+    tail = ['-map', video_output]
+    if audio_output:
+        tail.extend(['-map', audio_output])
+    if intermediate:
+        tail.extend(INTERMEDIATE_VIDEO_ARGS + ['-threads', str(threads or 0)])
+    else:
+        tail.extend(build_video_encoder_args(encoder, preset, threads))
+    if audio_output:
+        tail.extend(INTERMEDIATE_AUDIO_ARGS if intermediate else ['-c:a', 'aac', '-b:a', '192k'])
+    muxer_args = [] if intermediate else build_mp4_output_args(faststart)
+    
+    def build(
+        segments: List[Dict[str, Any]],
+        audio_clips: List[Dict[str, Any]],
+        output_path: str,
+        temp_dir: str = '/tmp',
+    ) -> List[str]:
+        if len(segments) != n_segments or len(audio_clips) != n_audio:
+            raise ValueError(
+                f"Pipeline compiled for {n_segments} segments/{n_audio} clips, "
+                f"got {len(segments)}/{len(audio_clips)}"
+            )
+        assets = assets_prefix(temp_dir)
+        inputs = []
+        filter_parts = []
+        total_duration: Any = 0  # spec durations are ints or floats; keep their repr
+        # One pass over the segments: still-frame input, Ken Burns chain and running duration
+        for i, segment in enumerate(segments):
+            inputs.append(('-i', assets + segment['localFile']))
+            filter_parts.append(_segment_ken_burns_filter(i, segment, fps, width, height))
+            total_duration += segment.get('duration', 5)
+        filter_parts.extend(video_tail)
         for i, clip in enumerate(audio_clips):
-            input_idx = audio_inputs_start + i
-            delay_ms = int(clip.get('startTime', 0) * 1000)
-            duration = clip.get('duration', 10)
-            volume = clip.get('volume', 1.0)
-            pr = clip.get('playbackRate', 1.0) or 1.0
-            tempo = build_atempo_filter_chain(float(pr))
-            chain = [f"adelay={delay_ms}|{delay_ms}"]
-            if tempo:
-                chain.append(tempo)
-            chain.append(f"volume={volume}")
-            chain.append("aformat=sample_fmts=fltp:sample_rates=48000:channel_layouts=stereo")
-            audio_filter = f"[{input_idx}:a]{','.join(chain)}[a{i}]"
-            filter_parts.append(audio_filter)
-            audio_mix_inputs.append(f"[a{i}]")
+            inputs.append(('-i', assets + clip['localFile']))
+            filter_parts.append(build_audio_clip_filter(clip, audio_inputs_start + i, f"[a{i}]"))
+        filter_parts.extend(audio_tail)
         
-        # Mix all audio tracks
-        if len(audio_mix_inputs) > 1:
-            mix_filter = f"{''.join(audio_mix_inputs)}amix=inputs={len(audio_clips)}:duration=longest:normalize=0[outa]"
-            filter_parts.append(mix_filter)
-            audio_output = "[outa]"
-        else:
-            audio_output = "[a0]"
-    else:
-        audio_output = None
+        # Assemble once instead of growing the command piecemeal
+        return list(chain(
+            head,
+            chain.from_iterable(inputs),
+            ('-filter_complex', ';'.join(filter_parts)),
+            tail,
+            ('-t', str(total_duration)),  # Output duration = total video length
+            muxer_args,
+            (intermediate_output_path(output_path) if intermediate else output_path,),
+        ))
+    
+    return build
+
+
+# Matches the key=value lines FFmpeg writes for -progress
+_PROGRESS_LINE = re.compile(r'^\w+=')
+
+# Seconds between progress log lines when no callback is given
+PROGRESS_LOG_INTERVAL = 10.0
+
+# Trailing stderr lines kept for the error report when FFmpeg fails
+STDERR_TAIL_LINES = 500
+
+# stderr pipe read buffer; -progress output is chatty on long renders
+STDERR_BUFSIZE = 1024 * 1024
+
+# Seconds without a new frame or output timestamp before a render counts as stalled
+STALL_TIMEOUT = 300.0
+
+# How often the watchdog checks for stalls, and the grace between SIGTERM and SIGKILL
+WATCHDOG_INTERVAL = 1.0
+TERMINATE_GRACE = 5.0
+
+# Streamed output: fragmented MP4 needs no seek back to write the moov atom, so it can go to a pipe
+STREAMED_OUTPUT = 'pipe:1'
+STREAMED_MP4_MOVFLAGS = '+frag_keyframe+empty_moov+default_base_moof'
+
+# Read buffer on FFmpeg's stdout when it is streamed to a consumer
+STDOUT_BUFSIZE = 16 * 1024 * 1024
+
+
+def _progress_int(value: Optional[str]) -> Optional[int]:
+    """Parse an integer -progress value (None when missing or N/A)."""
+    if value is None:
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        return None
+
+
+def parse_progress(line: str, state: Dict[str, str]) -> Optional[Dict[str, Any]]:
+    """
+    Accumulate one -progress key=value line; return an event when a block completes.
     
-    # Add filter complex to command
-    if filter_parts:
-        cmd.extend(['-filter_complex', ';'.join(filter_parts)])
+    Args:
+        line: A key=value line from FFmpeg's -progress output
+        state: Per-process dict holding the keys of the block in progress
     
-    # Map outputs
-    cmd.extend(['-map', video_output])
-    if audio_output:
-        cmd.extend(['-map', audio_output])
+    Returns:
+        Progress event (frame, out_time_ms, speed, done) on 'progress=' lines, else None
+    """
+    key, _, value = line.rstrip('\n').partition('=')
+    state[key] = value
+    if key != 'progress':
+        return None
+    # FFmpeg reports out_time_ms in microseconds (out_time_us on newer builds)
+    out_time_us = _progress_int(state.get('out_time_us', state.get('out_time_ms')))
+    try:
+        speed = float(state.get('speed', '').strip().rstrip('x'))
+    except ValueError:
+        speed = None
+    event = {
+        'frame': _progress_int(state.get('frame')),
+        'out_time_ms': out_time_us // 1000 if out_time_us is not None else None,
+        'speed': speed,
+        'done': value == 'end',
+    }
+    state.clear()
+    return event
+
+
+def _drain_ffmpeg_stderr(
+    stream,
+    on_progress: Optional[Callable[[Dict[str, Any]], None]],
+    log_lines: deque,
+    watchdog: Dict[str, Any],
+) -> None:
+    """
+    Reader-thread body: route -progress blocks to on_progress/log, keep the other
+    lines in log_lines, and stamp watchdog['at'] whenever output advances.
+    """
+    next_log = time.monotonic() + PROGRESS_LOG_INTERVAL
+    state: Dict[str, str] = {}
+    for line in stream:
+        if _PROGRESS_LINE.match(line):
+            event = parse_progress(line, state)
+            if event:
+                mark = (event['frame'], event['out_time_ms'])
+                if mark != watchdog['mark']:
+                    watchdog['mark'] = mark
+                    watchdog['at'] = time.monotonic()
+            if event and on_progress:
+                on_progress(event)
+            elif event and time.monotonic() >= next_log:
+                next_log = time.monotonic() + PROGRESS_LOG_INTERVAL
+                logger.info("[FFmpeg] Progress: frame=%s, time=%sms, speed=%sx", event['frame'], event['out_time_ms'], event['speed'])
+        else:
+            log_lines.append(line)
+
+
+def stream_output_command(cmd: List[str]) -> List[str]:
+    """
+    Rewrite a command built for an MP4 file so it writes fragmented MP4 to stdout.
     
-    # Output settings
-    cmd.extend([
-        '-c:v', 'libx264',
-        '-preset', 'medium',
-        '-crf', '23',
-        '-pix_fmt', 'yuv420p',
-    ])
+    -movflags +faststart (which rewrites the finished file) becomes
+    STREAMED_MP4_MOVFLAGS and the output path becomes STREAMED_OUTPUT.
+    """
+    out = cmd[:-1]
+    if '-movflags' in out:
+        out[out.index('-movflags') + 1] = STREAMED_MP4_MOVFLAGS
+    else:
+        out.extend(['-movflags', STREAMED_MP4_MOVFLAGS])
+    out.extend(['-f', 'mp4', STREAMED_OUTPUT])
+    return out
+
+
+class _CheckedOutputStream:
+    """
+    Read-only view of FFmpeg's stdout for a streaming consumer.
     
-    if audio_output:
-        cmd.extend([
-            '-c:a', 'aac',
-            '-b:a', '192k',
-        ])
+    Tracks tell() for consumers that need it (pipes cannot seek) and raises at
+    end of stream unless FFmpeg exited cleanly, so a failed or stopped render is
+    never passed on as a complete file.
+    """
     
-    # Set output duration based on total video length
-    total_duration = sum(seg.get('duration', 5) for seg in segments)
-    cmd.extend(['-t', str(total_duration)])
+    def __init__(self, stream: BinaryIO, proc: subprocess.Popen):
+        self._stream = stream
+        self._proc = proc
+        self._pos = 0
     
-    # Output file
-    cmd.append(output_path)
+    def read(self, size: int = -1) -> bytes:
+        data = self._stream.read(size)
+        self._pos += len(data)
+        if (size < 0 or len(data) < size) and self._proc.wait() != 0:
+            raise IOError(f"FFmpeg exited with code {self._proc.returncode} before finishing its output")
+        return data
     
-    return cmd
+    def tell(self) -> int:
+        return self._pos
 
 
-def run_ffmpeg(cmd: List[str], timeout: int = 3600) -> bool:
+def _consume_ffmpeg_stdout(
+    sink: Callable[[Any], None],
+    stream: _CheckedOutputStream,
+    pipe: BinaryIO,
+    result: Dict[str, Any],
+) -> None:
+    """
+    Sink-thread body: hand stdout to sink and record any error in result['error'].
+    The pipe is closed when sink returns so FFmpeg cannot block on a dead reader.
+    """
+    try:
+        sink(stream)
+    except Exception as e:
+        result['error'] = e
+    finally:
+        pipe.close()
+
+
+def _stop_ffmpeg(proc: subprocess.Popen) -> None:
+    """Stop a running FFmpeg process: SIGTERM, then SIGKILL after TERMINATE_GRACE."""
+    if proc.poll() is None:
+        proc.terminate()
+        try:
+            proc.wait(timeout=TERMINATE_GRACE)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+            proc.wait()
+
+
+def log_command(cmd: List[str]) -> None:
+    """Log argument count and output path; the full shell-quoted command only at DEBUG."""
+    logger.info("[FFmpeg] Running command: argc=%d out=%s", len(cmd), cmd[-1])
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("[FFmpeg] Full command: %s", shlex.join(cmd))
+
+
+def run_ffmpeg(
+    cmd: List[str],
+    timeout: int = 3600,
+    on_progress: Optional[Callable[[Dict[str, Any]], None]] = None,
+    stall_timeout: Optional[float] = STALL_TIMEOUT,
+    stdout_sink: Optional[Callable[[Any], None]] = None,
+) -> bool:
     """
     Execute FFmpeg command with progress logging.
     
+    stderr is drained by a reader thread through a STDERR_BUFSIZE pipe buffer
+    (never buffered whole); -progress events are passed to on_progress (called
+    on the reader thread), or logged every PROGRESS_LOG_INTERVAL seconds. A
+    watchdog stops the process (SIGTERM, then SIGKILL) on timeout or when neither
+    the frame count nor the output time advances for stall_timeout seconds.
+    
+    With stdout_sink (for commands from stream_output_command), FFmpeg's stdout is
+    read through a STDOUT_BUFSIZE buffer on a second thread and passed to
+    stdout_sink as a file-like object with read() and tell(); the render only
+    succeeds if the sink returns without raising.
+    
     Args:
         cmd: FFmpeg command as list of arguments
         timeout: Maximum execution time in seconds
+        on_progress: Optional callback receiving each progress event
+        stall_timeout: Seconds without progress before giving up (None = never)
+        stdout_sink: Optional consumer of the streamed output
     
     Returns:
         True if successful, False otherwise
     """
-    print(f"[FFmpeg] Running command: {' '.join(cmd[:10])}...")
+    log_command(cmd)
+    cmd = [cmd[0], '-nostdin', '-progress', 'pipe:2', '-nostats'] + cmd[1:]
     
+    log_lines: Deque[str] = deque(maxlen=STDERR_TAIL_LINES)  # last non-progress stderr lines
+    start = time.monotonic()
+    deadline = start + timeout
+    watchdog: Dict[str, Any] = {'at': start, 'mark': None}
+    
+    # stdout gets its own binary pipe; stderr stays a text pipe for the progress reader
+    stdout_fds = os.pipe() if stdout_sink else None
     try:
-        result = subprocess.run(
+        proc = subprocess.Popen(
             cmd,
-            capture_output=True,
+            stdin=subprocess.DEVNULL,
+            stdout=stdout_fds[1] if stdout_fds else subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
             text=True,
-            timeout=timeout,
+            bufsize=STDERR_BUFSIZE,
+            close_fds=True,
         )
+    except Exception as e:
+        logger.error("[FFmpeg] Exception: %s", e)
+        if stdout_fds:
+            os.close(stdout_fds[0])
+            os.close(stdout_fds[1])
+        return False
+    
+    reader = threading.Thread(
+        target=_drain_ffmpeg_stderr,
+        args=(proc.stderr, on_progress, log_lines, watchdog),
+        name='ffmpeg-stderr',
+        daemon=True,
+    )
+    reader.start()
+    
+    sink_result: Dict[str, Any] = {'error': None}
+    sink_thread = None
+    if stdout_fds:
+        os.close(stdout_fds[1])
+        stdout_pipe = os.fdopen(stdout_fds[0], 'rb', buffering=STDOUT_BUFSIZE)
+        sink_thread = threading.Thread(
+            target=_consume_ffmpeg_stdout,
+            args=(stdout_sink, _CheckedOutputStream(stdout_pipe, proc), stdout_pipe, sink_result),
+            name='ffmpeg-stdout',
+            daemon=True,
+        )
+        sink_thread.start()
+    
+    try:
+        while True:
+            try:
+                returncode = proc.wait(timeout=WATCHDOG_INTERVAL)
+                break
+            except subprocess.TimeoutExpired:
+                pass
+            now = time.monotonic()
+            if now > deadline:
+                logger.error("[FFmpeg] Timeout after %s seconds", timeout)
+                return False
+            if stall_timeout is not None and now - watchdog['at'] > stall_timeout:
+                logger.error("[FFmpeg] No progress for %s seconds (last frame=%s), stopping",
+                             stall_timeout, (watchdog['mark'] or (None,))[0])
+                return False
+        reader.join()
         
-        if result.returncode != 0:
-            print(f"[FFmpeg] Error: {result.stderr}")
+        if returncode != 0:
+            logger.error("[FFmpeg] Error: %s", ''.join(log_lines))
             return False
         
-        print("[FFmpeg] Render completed successfully")
+        if sink_thread is not None:
+            sink_thread.join()
+            if sink_result['error'] is not None:
+                logger.error("[FFmpeg] Output consumer failed: %s", sink_result['error'])
+                return False
+        
+        logger.info("[FFmpeg] Render completed successfully")
         return True
         
-    except subprocess.TimeoutExpired:
-        print(f"[FFmpeg] Timeout after {timeout} seconds")
+    except Exception as e:
+        logger.error("[FFmpeg] Exception: %s", e)
         return False
+    finally:
+        _stop_ffmpeg(proc)
+        reader.join()
+        if sink_thread is not None:
+            sink_thread.join()
+        if proc.stderr is not None:
+            proc.stderr.close()
+
+# ============================================================================
+# Parallel Chunked Rendering
+# ============================================================================
+
+# CPU cores given to each concurrent FFmpeg process
+CORES_PER_JOB = 2
+
+
+def default_parallelism() -> int:
+    """Number of concurrent FFmpeg processes for this host."""
+    return max(1, get_cpu_count() // CORES_PER_JOB)
+
+
+def segments_per_chunk(
+    n_segments: int,
+    chunk_size: int = MAX_SEGMENTS_PER_PASS,
+    parallelism: Optional[int] = None,
+) -> int:
+    """Segments per render chunk: enough chunks to keep every parallel slot busy, none over chunk_size."""
+    parallelism = parallelism or default_parallelism()
+    return max(1, min(chunk_size, -(-n_segments // parallelism)))
+
+
+def build_chunked_commands(
+    segments: List[Dict[str, Any]],
+    audio_clips: List[Dict[str, Any]],
+    output_path: str,
+    resolution: str = '1080p',
+    fps: FrameRate = 24,
+    temp_dir: str = '/tmp',
+    chunk_size: int = MAX_SEGMENTS_PER_PASS,
+    parallelism: Optional[int] = None,
+    encoder: str = DEFAULT_VIDEO_ENCODER,
+    preset: str = DEFAULT_X264_PRESET,
+    threads: Optional[int] = None,
+    intermediate: bool = False,
+) -> tuple:
+    """
+    Split a Ken Burns timeline into chunks that can be rendered concurrently.
+    
+    Each chunk renders its segments (video only) at final quality; the stitch
+    command joins the chunks with the concat demuxer (video stream copy) and
+    mixes the overlay audio over the whole timeline.
+    
+    Args:
+        segments: List of video segments with image paths and Ken Burns settings
+        audio_clips: List of audio clips with paths and timing
+        output_path: Path for output MP4 file
+        resolution: Output resolution ('720p', '1080p', '4K')
+        fps: Output frames per second
+        temp_dir: Directory containing downloaded assets
+        chunk_size: Maximum segments per chunk
+        parallelism: Concurrent FFmpeg processes (None = one per CORES_PER_JOB cores)
+        encoder: Video encoder (libx264 or a hardware encoder from VIDEO_ENCODER_ARGS)
+        preset: libx264 speed preset
+        threads: Thread count per chunk (None = CPUs divided among parallel chunks)
+        intermediate: Render chunks and stitched output as near-lossless MKV intermediates
+    
+    Returns:
+        (chunk_commands, stitch_command). When one pass is enough, chunk_commands
+        holds the full single-pass command and stitch_command is None.
+    """
+    per_chunk = segments_per_chunk(len(segments), chunk_size, parallelism)
+    parallelism = parallelism or default_parallelism()
+    chunks = [segments[i:i + per_chunk] for i in range(0, len(segments), per_chunk)]
+    
+    if len(chunks) <= 1:
+        return [build_single_pass_command(
+            segments, audio_clips, output_path, resolution, fps, temp_dir,
+            encoder=encoder, preset=preset, threads=threads, intermediate=intermediate,
+        )], None
+    
+    threads = threads or max(1, get_cpu_count() // min(parallelism, len(chunks)))
+    base = os.path.splitext(output_path)[0]
+    chunk_paths = []
+    chunk_commands = []
+    total_duration: Any = 0  # spec durations are ints or floats; keep their repr
+    for k, chunk in enumerate(chunks):
+        total_duration = sum((seg.get('duration', 5) for seg in chunk), total_duration)
+        chunk_path = f"{base}_part{k:03d}.mp4"
+        chunk_paths.append(intermediate_output_path(chunk_path) if intermediate else chunk_path)
+        chunk_commands.append(build_single_pass_command(
+            chunk, [], chunk_path, resolution, fps, temp_dir,
+            encoder=encoder, preset=preset, threads=threads, faststart=False,
+            intermediate=intermediate,
+        ))
+    logger.info("[FFmpeg] Split %d segments into %d chunks (%d parallel, %d threads each)",
+                len(segments), len(chunks), parallelism, threads)
+    
+    list_path = write_concat_list(chunk_paths, f"{base}_parts.txt")
+    # The stitch runs after every chunk has finished, so its audio graph gets all CPUs
+    stitch = ['ffmpeg', '-y'] + build_thread_args()
+    stitch.extend(['-f', 'concat', '-safe', '0', '-i', list_path])
+    assets = assets_prefix(temp_dir)
+    for clip in audio_clips:
+        stitch.extend(['-i', assets + clip['localFile']])
+    audio_filters, audio_output = build_audio_mix_filters(audio_clips, 1)
+    if audio_filters:
+        stitch.extend(['-filter_complex', ';'.join(audio_filters)])
+    stitch.extend(['-map', '0:v:0'])
+    if audio_output:
+        stitch.extend(['-map', audio_output])
+        stitch.extend(INTERMEDIATE_AUDIO_ARGS if intermediate else ['-c:a', 'aac', '-b:a', '192k'])
+    stitch.extend(['-c:v', 'copy', '-t', str(total_duration)])
+    if intermediate:
+        stitch.append(intermediate_output_path(output_path))
+    else:
+        stitch.extend(build_mp4_output_args())
+        stitch.append(output_path)
+    
+    return chunk_commands, stitch
+
+
+def run_ffmpeg_parallel(
+    cmds: List[List[str]],
+    parallelism: Optional[int] = None,
+    timeout: int = 3600,
+    ready: Optional[List[Callable[[], Optional[bool]]]] = None,
+    stall_timeout: Optional[float] = STALL_TIMEOUT,
+) -> bool:
+    """
+    Run independent FFmpeg commands concurrently, at most `parallelism` at a time.
+    
+    Each running process is pinned to its own contiguous slice of the available
+    CPUs (set right after launch, before FFmpeg starts its worker threads), so
+    the scaler and encoder threads keep their caches instead of migrating.
+    Commands should size -threads to the slice (build_chunked_commands does).
+    
+    Each process gets the run_ffmpeg watchdog: its stderr is drained on a reader
+    thread, and a process whose frame count and output time stop advancing for
+    stall_timeout seconds is stopped (SIGTERM, then SIGKILL) and fails the batch.
+    
+    Args:
+        cmds: FFmpeg commands as lists of arguments
+        parallelism: Maximum concurrent processes (None = one per CORES_PER_JOB cores)
+        timeout: Maximum execution time in seconds for the whole batch
+        ready: Per-command input gates, polled before launch: True when the command's
+            inputs are in place, None while they are still arriving, False when they
+            failed (fails the batch). Ready commands may launch out of order.
+        stall_timeout: Seconds without progress in any one process before giving up
+            (None = never)
+    
+    Returns:
+        True if every command succeeded, False otherwise (remaining jobs are killed)
+    """
+    gates: List[Optional[Callable[[], Optional[bool]]]] = list(ready) if ready else [None] * len(cmds)
+    if len(cmds) == 1:
+        gate = gates[0]
+        if gate is not None and not _wait_until_ready(gate, timeout):
+            return False
+        return run_ffmpeg(cmds[0], timeout=timeout, stall_timeout=stall_timeout)
+    
+    parallelism = parallelism or default_parallelism()
+    cpu_slices = build_cpu_slices(min(parallelism, len(cmds)))
+    free_slots = list(range(len(cpu_slices)))
+    deadline = time.monotonic() + timeout
+    pending = list(zip(cmds, gates))
+    running: List[Dict[str, Any]] = []  # process, stderr reader, log tail, watchdog, cpu slot
+    ok = True
+    
+    try:
+        while ok and (pending or running):
+            while pending and len(running) < parallelism:
+                launch = None
+                for k, (_, gate) in enumerate(pending):
+                    state = gate() if gate is not None else True
+                    if state is False:
+                        logger.error("[FFmpeg] Inputs for a render pass failed; aborting the batch")
+                        ok = False
+                        break
+                    if state:
+                        launch = k
+                        break
+                if launch is None:
+                    break
+                cmd = pending.pop(launch)[0]
+                log_command(cmd)
+                proc = subprocess.Popen(
+                    [cmd[0], '-nostdin', '-progress', 'pipe:2', '-nostats'] + cmd[1:],
+                    stdin=subprocess.DEVNULL,
+                    stdout=subprocess.DEVNULL,
+                    stderr=subprocess.PIPE,
+                    text=True,
+                    bufsize=STDERR_BUFSIZE,
+                    close_fds=True,
+                )
+                slot = free_slots.pop(0) if free_slots else None
+                if slot is not None:
+                    try:
+                        os.sched_setaffinity(proc.pid, cpu_slices[slot])
+                    except OSError as e:
+                        logger.warning("[FFmpeg] Could not pin worker to CPUs %s: %s", cpu_slices[slot], e)
+                job: Dict[str, Any] = {
+                    'proc': proc,
+                    'log_lines': deque(maxlen=STDERR_TAIL_LINES),
+                    'watchdog': {'at': time.monotonic(), 'mark': None},
+                    'slot': slot,
+                }
+                # Progress is only logged per process; the reader keeps the stderr pipe drained
+                job['reader'] = threading.Thread(
+                    target=_drain_ffmpeg_stderr,
+                    args=(proc.stderr, None, job['log_lines'], job['watchdog']),
+                    name='ffmpeg-stderr',
+                    daemon=True,
+                )
+                job['reader'].start()
+                running.append(job)
+            
+            now = time.monotonic()
+            for job in list(running):
+                proc = job['proc']
+                code = proc.poll()
+                if code is None:
+                    watchdog = job['watchdog']
+                    if stall_timeout is not None and now - watchdog['at'] > stall_timeout:
+                        logger.error("[FFmpeg] No progress for %s seconds (last frame=%s), stopping",
+                                     stall_timeout, (watchdog['mark'] or (None,))[0])
+                        ok = False
+                    continue
+                running.remove(job)
+                job['reader'].join()
+                proc.stderr.close()
+                if job['slot'] is not None:
+                    free_slots.append(job['slot'])
+                if code != 0:
+                    logger.error("[FFmpeg] Error: %s", ''.join(job['log_lines']))
+                    ok = False
+            
+            if now > deadline:
+                logger.error("[FFmpeg] Timeout after %s seconds", timeout)
+                ok = False
+            elif ok and (running or pending):
+                time.sleep(0.2)
     except Exception as e:
-        print(f"[FFmpeg] Exception: {e}")
+        logger.error("[FFmpeg] Exception: %s", e)
+        ok = False
+    finally:
+        for job in running:
+            _stop_ffmpeg(job['proc'])
+            job['reader'].join()
+            job['proc'].stderr.close()
+    
+    if ok:
+        logger.info("[FFmpeg] %s parallel renders completed successfully", len(cmds))
+    return ok
+
+
+def _wait_until_ready(gate: Callable[[], Optional[bool]], timeout: float) -> bool:
+    """Poll an input gate (see run_ffmpeg_parallel) until it settles; False on failure or timeout."""
+    deadline = time.monotonic() + timeout
+    while True:
+        state = gate()
+        if state is not None:
+            if not state:
+                logger.error("[FFmpeg] Inputs for the render failed")
+            return bool(state)
+        if time.monotonic() > deadline:
+            logger.error("[FFmpeg] Timeout after %s seconds waiting for inputs", timeout)
+            return False
+        time.sleep(0.2)
+
+
+def _all_ready(checks: List[Callable[[], Optional[bool]]]) -> Optional[bool]:
+    """Combine input gates: False if any failed, True once all are ready, else None."""
+    states = [check() for check in checks]
+    if any(state is False for state in states):
+        return False
+    return True if all(states) else None
+
+
+def build_and_run(
+    segments: List[Dict[str, Any]],
+    audio_clips: List[Dict[str, Any]],
+    output_path: str,
+    resolution: str = '1080p',
+    fps: FrameRate = 24,
+    temp_dir: str = '/tmp',
+    encoder: str = DEFAULT_VIDEO_ENCODER,
+    preset: str = DEFAULT_X264_PRESET,
+    parallelism: Optional[int] = None,
+    max_segments_per_pass: int = MAX_SEGMENTS_PER_PASS,
+    timeout: int = 3600,
+    threads: Optional[int] = None,
+    segment_ready: Optional[Callable[[int], Optional[bool]]] = None,
+) -> bool:
+    """
+    Render a Ken Burns timeline: chunks concurrently, then the stitch pass.
+    
+    Args:
+        segments: List of video segments with image paths and Ken Burns settings
+        audio_clips: List of audio clips with paths and timing
+        output_path: Path for output MP4 file
+        resolution: Output resolution ('720p', '1080p', '4K')
+        fps: Output frames per second
+        temp_dir: Directory containing downloaded assets
+        encoder: Video encoder (libx264 or a hardware encoder from VIDEO_ENCODER_ARGS)
+        preset: libx264 speed preset
+        parallelism: Concurrent FFmpeg processes (None = one per CORES_PER_JOB cores)
+        max_segments_per_pass: Maximum segments in one filter graph
+        timeout: Maximum execution time in seconds for each stage
+        threads: Thread count per chunk (None = CPUs divided among parallel chunks)
+        segment_ready: Input gate per segment index (True ready, None still downloading,
+            False failed). Each chunk starts as soon as its own segments are ready, so
+            rendering overlaps the remaining downloads. None = all inputs are in place.
+    
+    Returns:
+        True if successful, False otherwise
+    """
+    chunk_cmds, stitch_cmd = build_chunked_commands(
+        segments, audio_clips, output_path, resolution, fps, temp_dir,
+        chunk_size=max_segments_per_pass, parallelism=parallelism,
+        encoder=encoder, preset=preset, threads=threads,
+    )
+    logger.info("[FFmpeg] %s render pass(es)%s", len(chunk_cmds), ', plus stitch' if stitch_cmd else '')
+    gates: Optional[List[Callable[[], Optional[bool]]]] = None
+    if segment_ready is not None:
+        if stitch_cmd:
+            per_chunk = segments_per_chunk(len(segments), max_segments_per_pass, parallelism)
+        else:
+            per_chunk = max(1, len(segments))
+        gates = [
+            partial(_all_ready, [partial(segment_ready, i) for i in range(start, min(start + per_chunk, len(segments)))])
+            for start in range(0, len(segments), per_chunk)
+        ]
+    if not run_ffmpeg_parallel(chunk_cmds, parallelism, timeout=timeout, ready=gates):
         return False
+    return stitch_cmd is None or run_ffmpeg(stitch_cmd, timeout=timeout)
 
 
 # ============================================================================
 # Video Concatenation Functions (for scene-level renders)
 # ============================================================================
 
+# ffprobe results keyed by input path (assets do not change during a render)
+_probe_cache: Dict[str, Optional[Dict[str, Any]]] = {}
+
+
+def _parse_frame_rate(value: Any) -> Optional[Fraction]:
+    """Parse an ffprobe rate like '24000/1001'; None for missing or 0/0 rates."""
+    try:
+        rate = Fraction(str(value))
+    except (ValueError, ZeroDivisionError):
+        return None
+    return rate if rate > 0 else None
+
+
+def probe_segment(path: str) -> Optional[Dict[str, Any]]:
+    """
+    Probe a media file's first video and audio streams with ffprobe.
+
+    Returns:
+        Dict with container, width, height, frame_rate (Fraction, None when variable or
+        unknown), video_codec, profile, pix_fmt and audio (codec/sample_rate/channels dict,
+        or None without an audio stream); None when the file cannot be probed. Cached per path.
+    """
+    if path in _probe_cache:
+        return _probe_cache[path]
+
+    info = None
+    try:
+        result = subprocess.run(
+            [
+                'ffprobe', '-v', 'error',
+                '-show_entries',
+                'stream=codec_type,codec_name,profile,pix_fmt,width,height,'
+                'r_frame_rate,avg_frame_rate,sample_rate,channels:format=format_name',
+                '-of', 'json',
+                path,
+            ],
+            stdin=subprocess.DEVNULL,
+            capture_output=True,
+            text=True,
+            timeout=30,
+        )
+        probed = json.loads(result.stdout or '{}')
+        streams = probed.get('streams') or []
+        video = next((st for st in streams if st.get('codec_type') == 'video'), None)
+        audio = next((st for st in streams if st.get('codec_type') == 'audio'), None)
+        if result.returncode == 0 and video:
+            r_rate = _parse_frame_rate(video.get('r_frame_rate'))
+            avg_rate = _parse_frame_rate(video.get('avg_frame_rate'))
+            info = {
+                'container': (probed.get('format') or {}).get('format_name', ''),
+                'width': int(video.get('width') or 0),
+                'height': int(video.get('height') or 0),
+                # Variable frame rate streams report different real and average rates
+                'frame_rate': r_rate if r_rate == avg_rate else None,
+                'video_codec': video.get('codec_name'),
+                'profile': video.get('profile'),
+                'pix_fmt': video.get('pix_fmt'),
+                'audio': {
+                    'codec': audio.get('codec_name'),
+                    'sample_rate': audio.get('sample_rate'),
+                    'channels': audio.get('channels'),
+                } if audio else None,
+            }
+    except Exception as e:
+        logger.warning("[FFmpeg] ffprobe failed for %s: %s", path, e)
+
+    _probe_cache[path] = info
+    return info
+
+
+def probe_segments(paths: List[str]) -> List[Optional[Dict[str, Any]]]:
+    """Probe several inputs concurrently (ffprobe is process-bound, not CPU-bound here)."""
+    if not paths:
+        return []
+    with ThreadPoolExecutor(max_workers=min(PROBE_WORKERS, len(paths))) as executor:
+        return list(executor.map(probe_segment, paths))
+
+
+def _segment_needs_filters(segment: Dict[str, Any]) -> bool:
+    """True when a segment is trimmed, padded or cropped (work the concat demuxer cannot do)."""
+    return (
+        float(segment.get('videoTrimInSec') or 0) > 0.001
+        or segment.get('videoTrimOutSec') is not None
+        or float(segment.get('pauseDuration', 0)) > 0
+        or clamp_watermark_crop_percent(segment.get('watermarkCropPercent')) is not None
+    )
+
+
+def _all_segments_compatible(
+    video_segments: List[Dict[str, Any]],
+    probes: List[Optional[Dict[str, Any]]],
+    width: int,
+    height: int,
+    fps: FrameRate,
+    keep_audio: bool,
+    segment_audio_volume: float = 1.0,
+    stream_copy: bool = True,
+) -> bool:
+    """
+    True when the concat demuxer can join every segment: identically encoded video at
+    the output size and rate, no per-segment filters and, when segment audio is kept,
+    identically formatted audio from each segment at unit volume.
+    
+    With stream_copy the result must also be a valid final MP4 as-is: H.264/yuv420p
+    video and AAC audio from MP4 inputs (intermediates are always re-encoded).
+    """
+    first = probes[0] if probes else None
+    if not video_segments or first is None:
+        return False
+    target_rate = Fraction(fps)
+    for segment, probe in zip(video_segments, probes):
+        if probe is None or _segment_needs_filters(segment):
+            return False
+        if (
+            probe['video_codec'] != first['video_codec']
+            or probe['pix_fmt'] != first['pix_fmt']
+            or (probe['width'], probe['height']) != (width, height)
+            or probe['frame_rate'] != target_rate
+            or probe['profile'] != first['profile']
+        ):
+            return False
+        if stream_copy and (
+            probe['video_codec'] != 'h264'
+            or probe['pix_fmt'] != 'yuv420p'
+            or not probe['container'].startswith('mov')
+        ):
+            return False
+        if keep_audio:
+            if segment.get('audioSource', 'original') != 'original':
+                return False
+            if float(segment.get('audioVolume', segment_audio_volume)) != 1.0:
+                return False
+            if not probe['audio'] or probe['audio'] != first['audio']:
+                return False
+            if stream_copy and probe['audio']['codec'] != 'aac':
+                return False
+    return True
+
+
+def _can_stay_on_gpu(
+    hwaccel: Optional[str],
+    video_segments: List[Dict[str, Any]],
+    probes: List[Optional[Dict[str, Any]]],
+    width: int,
+    height: int,
+    burns_in: bool,
+) -> bool:
+    """
+    True when the concat video graph can run entirely on CUDA frames: only trim,
+    setpts, fps and scale_cuda are needed, so no crop, pause padding, text or
+    watermark, and every input is GPU-decodable with the output aspect ratio
+    (scale_cuda cannot letterbox).
+    """
+    if hwaccel not in GPU_RESIDENT_HWACCELS or burns_in:
+        return False
+    for segment, probe in zip(video_segments, probes):
+        if probe is None or probe['video_codec'] not in GPU_DECODABLE_CODECS:
+            return False
+        if probe['width'] * height != probe['height'] * width:
+            return False
+        if float(segment.get('pauseDuration', 0)) > 0:
+            return False
+        if clamp_watermark_crop_percent(segment.get('watermarkCropPercent')) is not None:
+            return False
+    return True
+
+
+def write_concat_list(paths: List[str], list_path: str) -> str:
+    """Write an ffmpeg concat demuxer list file and return its path."""
+    with open(list_path, 'w') as f:
+        for path in paths:
+            escaped = path.replace("'", "'\\''")
+            f.write(f"file '{escaped}'\n")
+    return list_path
+
+
+def build_concat_demuxer_encode_command(
+    list_path: str,
+    audio_clips: List[Dict[str, Any]],
+    output_path: str,
+    width: int,
+    height: int,
+    temp_dir: str = '/tmp',
+    keep_audio: bool = True,
+    text_overlays: Optional[List[Dict[str, Any]]] = None,
+    watermark: Optional[Dict[str, Any]] = None,
+    encoder: str = DEFAULT_VIDEO_ENCODER,
+    preset: str = DEFAULT_X264_PRESET,
+    threads: Optional[int] = None,
+    copy_video: bool = False,
+    remote_inputs: bool = False,
+) -> List[str]:
+    """
+    Join the files in a concat list and encode the result once.
+    
+    Used when the segments need no per-segment work; overlay audio, text overlays
+    and the watermark are applied to the joined stream. With copy_video the
+    segments' video is stream-copied and only the mixed audio is encoded
+    (no burn-ins possible).
+    
+    Args:
+        list_path: Concat demuxer list of the segment files
+        audio_clips: List of audio clips with paths and timing
+        output_path: Path for output MP4 file
+        width: Output width
+        height: Output height
+        temp_dir: Directory containing downloaded assets
+        keep_audio: Whether to keep the segments' own audio
+        text_overlays: List of text overlays to burn into the video
+        watermark: Watermark specification to burn into the video
+        encoder: Video encoder (libx264 or a hardware encoder from VIDEO_ENCODER_ARGS)
+        preset: libx264 speed preset
+        threads: Filter and encoder thread count (None = all available CPUs)
+        copy_video: Stream-copy the joined video instead of encoding it
+        remote_inputs: The concat list names http(s) URLs
+    
+    Returns:
+        FFmpeg command as list of arguments
+    """
+    if copy_video:
+        text_overlays, watermark = None, None
+    cmd = ['ffmpeg', '-y']
+    cmd.extend(build_thread_args(threads))
+    if not copy_video:
+        cmd.extend(build_encoder_device_args(encoder))
+    cmd.extend(build_concat_list_input_args(list_path, remote_inputs))
+    
+    assets = assets_prefix(temp_dir)
+    next_input = 1
+    wm_input_idx = None
+    if watermark and watermark.get('type') == 'image' and watermark.get('localFile'):
+        cmd.extend(['-i', assets + watermark['localFile']])
+        wm_input_idx = next_input
+        next_input += 1
+    for clip in audio_clips:
+        cmd.extend(['-i', assets + clip['localFile']])
+    
+    filter_parts, video_output = build_burn_in_filters(
+        "[0:v]", text_overlays, watermark, wm_input_idx, width, height,
+    )
+    upload_filter = None if copy_video else build_encoder_upload_filter(encoder, video_output, "[hwv]")
+    if upload_filter:
+        filter_parts.append(upload_filter)
+        video_output = "[hwv]"
+    
+    audio_output = "[0:a]" if keep_audio else None
+    if audio_clips:
+        mix_inputs = []
+        if keep_audio:
+            filter_parts.append("[0:a]aformat=sample_fmts=fltp:sample_rates=48000:channel_layouts=stereo[src_audio]")
+            mix_inputs.append("[src_audio]")
+        for i, clip in enumerate(audio_clips):
+            filter_parts.append(build_audio_clip_filter(clip, next_input + i, f"[overlay_a{i}]"))
+            mix_inputs.append(f"[overlay_a{i}]")
+        if len(mix_inputs) > 1:
+            filter_parts.append(
+                f"{''.join(mix_inputs)}amix=inputs={len(mix_inputs)}:duration=longest:normalize=0:dropout_transition=0[outa]"
+            )
+            audio_output = "[outa]"
+        else:
+            audio_output = mix_inputs[0]
+    
+    if filter_parts:
+        cmd.extend(['-filter_complex', ';'.join(filter_parts)])
+    
+    # Unfiltered streams are mapped by specifier, filter outputs by label
+    cmd.extend(['-map', '0:v:0' if video_output == "[0:v]" else video_output])
+    if audio_output:
+        cmd.extend(['-map', '0:a:0' if audio_output == "[0:a]" else audio_output])
+    
+    if copy_video:
+        cmd.extend(['-c:v', 'copy'])
+    else:
+        cmd.extend(build_video_encoder_args(encoder, preset, threads))
+    if audio_output:
+        cmd.extend(['-c:a', 'aac', '-b:a', '192k'])
+    cmd.extend(build_mp4_output_args())
+    cmd.append(output_path)
+    return cmd
+
+
+def build_concat_copy_command(
+    list_path: str,
+    output_path: str,
+    keep_audio: bool = True,
+    remote_inputs: bool = False,
+) -> List[str]:
+    """Join the files in a concat list without re-encoding (stream copy)."""
+    cmd = ['ffmpeg', '-y']
+    cmd.extend(build_concat_list_input_args(list_path, remote_inputs))
+    cmd.extend(['-map', '0:v:0'])
+    cmd.extend(['-map', '0:a:0'] if keep_audio else ['-an'])
+    cmd.extend(['-c', 'copy'])
+    cmd.extend(build_mp4_output_args())
+    cmd.append(output_path)
+    return cmd
+
+
+def build_renditions_command(
+    input_path: str,
+    renditions: List[Tuple[str, str]],
+    encoder: str = DEFAULT_VIDEO_ENCODER,
+    hwaccel: Optional[str] = None,
+    preset: str = DEFAULT_X264_PRESET,
+    threads: Optional[int] = None,
+) -> List[str]:
+    """
+    Transcode a finished render into extra resolutions in one FFmpeg process.
+    
+    The input is demuxed and decoded once; split fans the frames out to one
+    scaler + encoder per rendition, and the audio track is stream-copied.
+    
+    Args:
+        input_path: Rendered master MP4
+        renditions: (resolution, output_path) pairs, e.g. ('720p', '/tmp/output/job_720p.mp4')
+        encoder: Video encoder (libx264 or a hardware encoder from VIDEO_ENCODER_ARGS)
+        hwaccel: Hardware decoder for the input ('cuda', 'qsv', 'vaapi') or None
+        preset: libx264 speed preset
+        threads: Filter and encoder thread count (None = all available CPUs)
+    
+    Returns:
+        FFmpeg command as list of arguments
+    """
+    encoder = resolve_video_encoder(encoder)
+    
+    cmd = ['ffmpeg', '-y']
+    cmd.extend(build_thread_args(threads))
+    cmd.extend(build_encoder_device_args(encoder))
+    cmd.extend(build_hwaccel_input_args(hwaccel))
+    cmd.extend(['-i', input_path])
+    
+    count = len(renditions)
+    filter_parts = [f"[0:v]split={count}" + ''.join(f"[s{i}]" for i in range(count))]
+    for i, (resolution, _) in enumerate(renditions):
+        width, height = resolve_resolution(resolution)
+        fit_filter = (
+            f"scale={width}:{height}:force_original_aspect_ratio=decrease,"
+            f"pad={width}:{height}:(ow-iw)/2:(oh-ih)/2:black"
+        )
+        upload_filter = build_encoder_upload_filter(encoder, f"[f{i}]", f"[v{i}]")
+        if upload_filter:
+            filter_parts.append(f"[s{i}]{fit_filter}[f{i}]")
+            filter_parts.append(upload_filter)
+        else:
+            filter_parts.append(f"[s{i}]{fit_filter}[v{i}]")
+    cmd.extend(['-filter_complex', ';'.join(filter_parts)])
+    
+    # One output block per rendition, all fed from the same decode
+    for i, (_, output_path) in enumerate(renditions):
+        cmd.extend(['-map', f"[v{i}]", '-map', '0:a:0?'])
+        cmd.extend(build_video_encoder_args(encoder, preset, threads))
+        cmd.extend(['-c:a', 'copy'])
+        cmd.extend(build_mp4_output_args())
+        cmd.append(output_path)
+    
+    return cmd
+
+
+def build_burn_in_filters(
+    video_output: str,
+    text_overlays: Optional[List[Dict[str, Any]]],
+    watermark: Optional[Dict[str, Any]],
+    wm_input_idx: Optional[int],
+    width: int,
+    height: int,
+) -> tuple:
+    """
+    Build the text overlay and watermark filters burned into the finished video.
+    
+    Args:
+        video_output: Label of the video stream to draw on
+        text_overlays: List of text overlays to burn into the video
+        watermark: Watermark specification to burn into the video
+        wm_input_idx: Input index of the watermark image (image watermarks only)
+        width: Output width
+        height: Output height
+    
+    Returns:
+        (filter_parts, video_output) with the label of the resulting stream
+    """
+    filter_parts = []
+    watermark = watermark or {}
+    wm_type = watermark.get('type')
+    
+    # Text overlays, then a text watermark, drawn in one drawtext chain
+    text_chain = []
+    if text_overlays and len(text_overlays) > 0:
+        logger.info("[FFmpeg] Adding %s text overlay(s)", len(text_overlays))
+        text_chain = build_text_overlay_chain(text_overlays, width, height)
+    
+    if wm_type == 'text':
+        tprev = str((watermark.get('text') or ''))[:30]
+        logger.info("[FFmpeg] Adding text watermark: text=%r...", tprev)
+        text_chain.append(build_watermark_text_filter(
+            watermark=watermark,
+            input_label='',
+            output_label='',
+            width=width,
+            height=height,
+        ))
+    
+    if text_chain:
+        filter_parts.append(f"{video_output}{','.join(text_chain)}[textv]")
+        video_output = "[textv]"
+    
+    # Apply image watermark to the video stream (after text overlays)
+    if wm_type == 'image' and wm_input_idx is not None:
+        ist = watermark.get('imageStyle') or {}
+        wm_w = max(8, int((ist.get('width', 10) / 100.0) * width))
+        opacity = float(ist.get('opacity', 0.7))
+        pad = int(watermark.get('padding', 60))
+        anchor = str(watermark.get('anchor', 'bottom-right'))
+        logger.info("[FFmpeg] Adding image watermark: anchor=%s, widthPx=%s, opacity=%s", anchor, wm_w, opacity)
+        img_filters = build_image_watermark_filters(
+            wm_input_idx=wm_input_idx,
+            input_label=video_output,
+            output_label="[wmv]",
+            anchor=anchor,
+            padding=pad,
+            wm_width_px=wm_w,
+            opacity=opacity,
+        )
+        filter_parts.extend(img_filters)
+        video_output = "[wmv]"
+    elif wm_type and wm_type != 'text':
+        logger.warning("[FFmpeg] Skipping watermark: type=%r, imageInputOk=%s", wm_type, wm_input_idx is not None)
+    
+    return filter_parts, video_output
+
+
+def _fused_segment_audio_volume(
+    segments: List[Dict[str, Any]],
+    probes: List[Optional[Dict[str, Any]]],
+    default_volume: float,
+) -> Optional[float]:
+    """
+    Shared volume when segment audio can be concatenated straight from the inputs.
+    
+    That holds when every segment keeps its own (probed) audio, untrimmed and
+    unpadded, at one volume: concat then resets the per-segment timestamps and a
+    single aformat/volume after it replaces the per-segment chains. None when
+    any segment needs its own chain.
+    """
+    volumes = set()
+    for segment, probe in zip(segments, probes):
+        if (
+            segment.get('audioSource', 'original') != 'original'
+            or probe is None
+            or not probe['audio']
+            or float(segment.get('pauseDuration', 0)) > 0
+            or float(segment.get('videoTrimInSec') or 0) > 0.001
+            or segment.get('videoTrimOutSec') is not None
+        ):
+            return None
+        volumes.add(segment.get('audioVolume', default_volume))
+    return volumes.pop() if len(volumes) == 1 else None
+
+
 def build_concat_ffmpeg_command(
     video_segments: List[Dict[str, Any]],
     audio_clips: List[Dict[str, Any]],
     output_path: str,
     resolution: str = '1080p',
-    fps: int = 24,
+    fps: FrameRate = 24,
     temp_dir: str = '/tmp',
     include_segment_audio: bool = True,
     segment_audio_volume: float = 1.0,
     text_overlays: Optional[List[Dict[str, Any]]] = None,
     watermark: Optional[Dict[str, Any]] = None,
+    encoder: str = DEFAULT_VIDEO_ENCODER,
+    hwaccel: Optional[str] = None,
+    preset: str = DEFAULT_X264_PRESET,
+    threads: Optional[int] = None,
 ) -> List[str]:
     """
     Build FFmpeg command for concatenating video segments with audio mixing.
@@ -817,7 +2526,7 @@ def build_concat_ffmpeg_command(
     and need to concatenate them with audio tracks.
     
     Args:
-        video_segments: List of video segments with paths and timing
+        video_segments: List of video segments with paths and timing (localFile may be an http(s) URL)
         audio_clips: List of audio clips with paths and timing
         output_path: Path for output MP4 file
         resolution: Output resolution ('720p', '1080p', '4K')
@@ -827,30 +2536,110 @@ def build_concat_ffmpeg_command(
         segment_audio_volume: Volume level for segment audio (0.0 to 1.0)
         text_overlays: List of text overlays to burn into the video
         watermark: Watermark specification to burn into the video
+        encoder: Video encoder (libx264 or a hardware encoder from VIDEO_ENCODER_ARGS)
+        hwaccel: Hardware decoder for the video inputs ('cuda', 'qsv', 'vaapi') or None
+        preset: libx264 speed preset
+        threads: Filter and encoder thread count (None = all available CPUs)
     
     Returns:
         FFmpeg command as list of arguments
     """
-    res = RESOLUTIONS.get(resolution, RESOLUTIONS['1080p'])
-    width, height = res['width'], res['height']
+    width, height = resolve_resolution(resolution)
+    encoder = resolve_video_encoder(encoder)
     
     cmd = ['ffmpeg', '-y']  # -y = overwrite output
+    cmd.extend(build_thread_args(threads))
+    cmd.extend(build_encoder_device_args(encoder))
+    
+    assets = assets_prefix(temp_dir)
+    # localFile may also be an http(s) URL that FFmpeg streams without a local copy
+    video_paths = [asset_input_path(assets, segment['localFile']) for segment in video_segments]
+    remote_inputs = any(is_remote_input(path) for path in video_paths)
+    
+    # Read each per-segment field once up front; the loops below index plain lists
+    audio_sources = [segment.get('audioSource', 'original') for segment in video_segments]
+    audio_volumes = [segment.get('audioVolume', segment_audio_volume) for segment in video_segments]
+    durations = [segment.get('duration', 5) for segment in video_segments]
+    pause_durations = [float(segment.get('pauseDuration', 0)) for segment in video_segments]
+    trim_ins = [float(segment.get('videoTrimInSec') or 0) for segment in video_segments]
+    trim_outs = [segment.get('videoTrimOutSec') for segment in video_segments]
+    crop_percents = [segment.get('watermarkCropPercent') for segment in video_segments]
+    voiceover_files = [segment.get('voiceoverLocalFile') for segment in video_segments]
+    
+    # Inputs that already match the output size/rate skip the scaler and fps filter
+    segment_probes = probe_segments(video_paths)
+    target_rate = Fraction(fps)
+    
+    # Fast path: nothing to burn in and every segment already matches the output,
+    # so the concat demuxer can join the files without decoding or re-encoding the video
+    # (overlay audio alone only re-encodes the audio)
+    keep_segment_audio = include_segment_audio and any(
+        audio_source in ('original', 'voiceover') for audio_source in audio_sources
+    )
+    has_watermark = bool(watermark and watermark.get('type'))
+    list_path = os.path.join(
+        temp_dir, os.path.splitext(os.path.basename(output_path))[0] + '_concat.txt'
+    )
+    if (
+        not text_overlays
+        and not has_watermark
+        and _all_segments_compatible(
+            video_segments, segment_probes, width, height, fps,
+            keep_segment_audio, segment_audio_volume,
+        )
+    ):
+        write_concat_list(video_paths, list_path)
+        if not audio_clips:
+            logger.info("[FFmpeg] All %s segments are stream-compatible; using concat demuxer copy", len(video_segments))
+            return build_concat_copy_command(
+                list_path, output_path, keep_audio=keep_segment_audio, remote_inputs=remote_inputs,
+            )
+        logger.info("[FFmpeg] All %s segments are stream-compatible; copying video, mixing %s audio clip(s)",
+                    len(video_segments), len(audio_clips))
+        return build_concat_demuxer_encode_command(
+            list_path, audio_clips, output_path, width, height, temp_dir,
+            keep_segment_audio, threads=threads, copy_video=True, remote_inputs=remote_inputs,
+        )
+    
+    # Identically encoded segments (e.g. intermediates) still skip the per-input graph:
+    # the demuxer joins them and the only encode is the final one
+    if not hwaccel and _all_segments_compatible(
+        video_segments, segment_probes, width, height, fps,
+        keep_segment_audio, segment_audio_volume, stream_copy=False,
+    ):
+        write_concat_list(video_paths, list_path)
+        logger.info("[FFmpeg] All %s segments share one encoding; using concat demuxer + single encode", len(video_segments))
+        return build_concat_demuxer_encode_command(
+            list_path, audio_clips, output_path, width, height, temp_dir,
+            keep_segment_audio, text_overlays, watermark, encoder, preset, threads,
+            remote_inputs=remote_inputs,
+        )
+    
+    # With CUDA decode and a GPU-only graph, frames stay in GPU memory from decode to encode
+    gpu_resident = _can_stay_on_gpu(
+        hwaccel, video_segments, segment_probes, width, height,
+        burns_in=bool(text_overlays) or has_watermark,
+    )
+    if gpu_resident:
+        logger.info("[FFmpeg] Keeping decoded frames on the GPU (scale_cuda)")
+    hwaccel_args = build_hwaccel_input_args(hwaccel, keep_on_device=gpu_resident)
     
     # Add input files (videos)
-    for i, segment in enumerate(video_segments):
-        video_path = os.path.join(temp_dir, 'assets', segment['localFile'])
-        cmd.extend(['-i', video_path])
+    for video_path in video_paths:
+        cmd.extend(hwaccel_args)
+        if is_remote_input(video_path):
+            cmd.extend(REMOTE_INPUT_ARGS)
+        # Regenerate missing timestamps so setpts/trim see a monotonic clock
+        cmd.extend(['-fflags', '+genpts', '-i', video_path])
     
     # Track input indices
     video_input_count = len(video_segments)
     
     # Add voiceover input files for segments that use voiceover
-    voiceover_input_map = {}  # Maps segment index to input index
-    for i, segment in enumerate(video_segments):
-        audio_source = segment.get('audioSource', 'original')
-        voiceover_file = segment.get('voiceoverLocalFile')
-        if audio_source == 'voiceover' and voiceover_file:
-            voiceover_path = os.path.join(temp_dir, 'assets', voiceover_file)
+    voiceover_input_map: Dict[int, int] = {}  # Maps segment index to input index
+    for i, voiceover_file in enumerate(voiceover_files):
+        if audio_sources[i] == 'voiceover' and voiceover_file:
+            voiceover_path = assets + voiceover_file
             cmd.extend(['-i', voiceover_path])
             voiceover_input_map[i] = video_input_count + len(voiceover_input_map)
     
@@ -862,14 +2651,14 @@ def build_concat_ffmpeg_command(
         and watermark.get('type') == 'image'
         and watermark.get('localFile')
     ):
-        wm_path = os.path.join(temp_dir, 'assets', watermark['localFile'])
+        wm_path = assets + watermark['localFile']
         cmd.extend(['-i', wm_path])
         wm_input_idx = base_after_videos
     
     # Add overlay audio input files (music, sfx, etc.) — after video, voiceover, optional watermark image
     audio_inputs_start = base_after_videos + (1 if wm_input_idx is not None else 0)
     for i, clip in enumerate(audio_clips):
-        audio_path = os.path.join(temp_dir, 'assets', clip['localFile'])
+        audio_path = assets + clip['localFile']
         cmd.extend(['-i', audio_path])
     
     # Build filter complex
@@ -882,56 +2671,73 @@ def build_concat_ffmpeg_command(
     if not include_segment_audio:
         for segment in video_segments:
             segment['audioSource'] = 'none'
+        audio_sources = ['none'] * len(video_segments)
 
-    has_embed_audio = include_segment_audio and any(
-        segment.get('audioSource', 'original') in ('original', 'voiceover')
-        for segment in video_segments
+    has_embed_audio = keep_segment_audio
+    fused_audio_volume = (
+        _fused_segment_audio_volume(video_segments, segment_probes, segment_audio_volume)
+        if has_embed_audio else None
     )
     
+    # Resolution/rate conforming filters are the same for every segment that needs them
+    if gpu_resident:
+        fit_filter = f"scale_cuda={width}:{height},"
+    else:
+        fit_filter = (
+            f"scale={width}:{height}:force_original_aspect_ratio=decrease,"
+            f"pad={width}:{height}:(ow-iw)/2:(oh-ih)/2:black,"
+        )
+    rate_filter = f"fps={fps},"
+    
     for i, segment in enumerate(video_segments):
-        pause_duration = float(segment.get('pauseDuration', 0))
+        pause_duration = pause_durations[i]
         tpad_str = f",tpad=stop_mode=clone:stop_duration={pause_duration}" if pause_duration > 0 else ""
         apad_str = f",apad=pad_dur={pause_duration}" if pause_duration > 0 else ""
 
-        crop_filter = build_frame_crop_filter(segment.get('watermarkCropPercent'))
+        crop_filter = build_frame_crop_filter(crop_percents[i])
 
-        trim_in = float(segment.get('videoTrimInSec') or 0)
-        raw_trim_out = segment.get('videoTrimOutSec')
-        trim_filter = ""
+        trim_in = trim_ins[i]
+        raw_trim_out = trim_outs[i]
+        trim_clause = ""
         if trim_in > 0.001 or raw_trim_out is not None:
             end_clause = f":end={float(raw_trim_out)}" if raw_trim_out is not None else ""
-            trim_filter = f"trim=start={trim_in}{end_clause},"
+            trim_clause = f"start={trim_in}{end_clause},"
+        trim_filter = f"trim={trim_clause}" if trim_clause else ""
         
-        # Scale to target resolution and set framerate
+        # Set framerate, then scale to target resolution (each skipped when the input already matches)
+        # fps runs first so a misdetected or high input rate is decimated before the scaler sees it
         # setpts=PTS-STARTPTS resets video timestamps to start at 0 for proper concatenation sync
+        probe = segment_probes[i]
+        size_matches = (
+            probe is not None
+            and not crop_filter
+            and (probe['width'], probe['height']) == (width, height)
+        )
+        rate_matches = probe is not None and probe['frame_rate'] == target_rate
+        scale_filter = "" if size_matches else fit_filter
+        fps_filter = "" if rate_matches else rate_filter
         filter_str = (
-            f"[{i}:v]{trim_filter}setpts=PTS-STARTPTS,{crop_filter}scale={width}:{height}:force_original_aspect_ratio=decrease,"
-            f"pad={width}:{height}:(ow-iw)/2:(oh-ih)/2:black,"
-            f"fps={fps},setsar=1{tpad_str}[v{i}]"
+            f"[{i}:v]{trim_filter}setpts=PTS-STARTPTS,{fps_filter}{crop_filter}{scale_filter}"
+            f"setsar=1{tpad_str}[v{i}]"
         )
         filter_parts.append(filter_str)
         video_concat_inputs.append(f"[v{i}]")
         
         # Check per-segment audio source and volume
-        audio_source = segment.get('audioSource', 'original')
-        seg_audio_volume = segment.get('audioVolume', segment_audio_volume)
-        duration = segment.get('duration', 5)
+        audio_source = audio_sources[i]
+        seg_audio_volume = audio_volumes[i]
+        duration = durations[i]
         
         # Debug: Log per-segment audio settings
-        print(f"[FFmpeg] Segment {i}: audioSource='{audio_source}', volume={seg_audio_volume}, duration={duration}, pauseDuration={pause_duration}")
+        logger.info("[FFmpeg] Segment %s: audioSource='%s', volume=%s, duration=%s, pauseDuration=%s", i, audio_source, seg_audio_volume, duration, pause_duration)
         
-        if not has_embed_audio:
+        if not has_embed_audio or fused_audio_volume is not None:
             continue
         
         if audio_source == 'original':
             # Use original MP4 audio - normalize format for concat compatibility
-            print(f"[FFmpeg] Segment {i}: Using ORIGINAL audio from MP4")
-            trim_in = float(segment.get('videoTrimInSec') or 0)
-            raw_trim_out = segment.get('videoTrimOutSec')
-            atrim_clause = ""
-            if trim_in > 0.001 or raw_trim_out is not None:
-                end_clause = f":end={float(raw_trim_out)}" if raw_trim_out is not None else ""
-                atrim_clause = f"atrim=start={trim_in}{end_clause},"
+            logger.info("[FFmpeg] Segment %s: Using ORIGINAL audio from MP4", i)
+            atrim_clause = f"atrim={trim_clause}" if trim_clause else ""
             audio_filter = f"[{i}:a]{atrim_clause}asetpts=PTS-STARTPTS,aformat=sample_fmts=fltp:sample_rates=48000:channel_layouts=stereo{apad_str}"
             if seg_audio_volume != 1.0:
                 audio_filter += f",volume={seg_audio_volume}"
@@ -953,7 +2759,7 @@ def build_concat_ffmpeg_command(
             segment_audio_streams.append((f"[vo_audio_{i}]", duration + pause_duration))
         else:
             # Muted segment — synthetic silence for timeline alignment (no embedded audio)
-            print(f"[FFmpeg] Segment {i}: Synthetic silence for muted segment ({duration + pause_duration}s)")
+            logger.info("[FFmpeg] Segment %s: Synthetic silence for muted segment (%ss)", i, duration + pause_duration)
             silent_dur = duration + pause_duration
             audio_filter = (
                 f"anullsrc=channel_layout=stereo:sample_rate=48000,"
@@ -970,63 +2776,37 @@ def build_concat_ffmpeg_command(
     else:
         video_output = "[v0]"
     
-    # Apply text overlays to the video stream
-    if text_overlays and len(text_overlays) > 0:
-        print(f"[FFmpeg] Adding {len(text_overlays)} text overlay(s)")
-        text_filters = build_text_overlay_filters(
-            text_overlays=text_overlays,
-            input_label=video_output,
-            output_label="[textv]",
-            width=width,
-            height=height,
-        )
-        if text_filters:
-            filter_parts.extend(text_filters)
-            video_output = "[textv]"
-    
-    # Apply watermark to the video stream (after text overlays)
-    if watermark and watermark.get('type'):
-        wm_type = watermark.get('type')
-        if wm_type == 'image' and wm_input_idx is not None:
-            ist = watermark.get('imageStyle') or {}
-            wm_w = max(8, int((ist.get('width', 10) / 100.0) * width))
-            opacity = float(ist.get('opacity', 0.7))
-            pad = int(watermark.get('padding', 60))
-            anchor = str(watermark.get('anchor', 'bottom-right'))
-            print(f"[FFmpeg] Adding image watermark: anchor={anchor}, widthPx={wm_w}, opacity={opacity}")
-            img_filters = build_image_watermark_filters(
-                wm_input_idx=wm_input_idx,
-                input_label=video_output,
-                output_label="[wmv]",
-                anchor=anchor,
-                padding=pad,
-                wm_width_px=wm_w,
-                opacity=opacity,
-            )
-            filter_parts.extend(img_filters)
-            video_output = "[wmv]"
-        elif wm_type == 'text':
-            tprev = str((watermark.get('text') or ''))[:30]
-            print(f"[FFmpeg] Adding text watermark: text={tprev!r}...")
-            wm_filter = build_watermark_text_filter(
-                watermark=watermark,
-                input_label=video_output,
-                output_label="[wmv]",
-                width=width,
-                height=height,
-            )
-            if wm_filter:
-                filter_parts.append(wm_filter)
-                video_output = "[wmv]"
-        else:
-            print(f"[FFmpeg] Skipping watermark: type={wm_type!r}, imageInputOk={wm_input_idx is not None}")
+    burn_filters, video_output = build_burn_in_filters(
+        video_output, text_overlays, watermark, wm_input_idx, width, height,
+    )
+    filter_parts.extend(burn_filters)
+    
+    # Non-NVENC encoders take system-memory frames: download once, after the concat
+    if gpu_resident and not encoder.endswith('_nvenc'):
+        filter_parts.append(f"{video_output}hwdownload,format=nv12[dlv]")
+        video_output = "[dlv]"
+    
+    upload_filter = build_encoder_upload_filter(encoder, video_output, "[hwv]")
+    if upload_filter:
+        filter_parts.append(upload_filter)
+        video_output = "[hwv]"
     
     # Initialize audio tracking
     src_audio_output = None
     all_audio_inputs = []
     
+    if fused_audio_volume is not None:
+        # Raw segment audio, concatenated then normalized once
+        volume_str = f",volume={fused_audio_volume}" if fused_audio_volume != 1.0 else ""
+        filter_parts.append(
+            f"{''.join(f'[{i}:a]' for i in range(len(video_segments)))}"
+            f"concat=n={len(video_segments)}:v=0:a=1,asetpts=PTS-STARTPTS,"
+            f"aformat=sample_fmts=fltp:sample_rates=48000:channel_layouts=stereo{volume_str}[src_audio]"
+        )
+        src_audio_output = "[src_audio]"
+        all_audio_inputs.append(src_audio_output)
     # Concatenate all segment audio streams (each stream can be original, voiceover, or silence)
-    if len(segment_audio_streams) > 0:
+    elif len(segment_audio_streams) > 0:
         if len(segment_audio_streams) > 1:
             audio_stream_refs = ''.join([s[0] for s in segment_audio_streams])
             src_audio_concat = f"{audio_stream_refs}concat=n={len(segment_audio_streams)}:v=0:a=1[src_audio]"
@@ -1039,24 +2819,12 @@ def build_concat_ffmpeg_command(
     # Audio mixing: combine source audio with overlay audio clips
     if audio_clips:
         for i, clip in enumerate(audio_clips):
-            input_idx = audio_inputs_start + i
-            delay_ms = int(clip.get('startTime', 0) * 1000)
-            duration = clip.get('duration', 10)
-            volume = clip.get('volume', 1.0)
-            pr = clip.get('playbackRate', 1.0) or 1.0
-            tempo = build_atempo_filter_chain(float(pr))
-            chain = [f"adelay={delay_ms}|{delay_ms}"]
-            if tempo:
-                chain.append(tempo)
-            chain.append(f"volume={volume}")
-            chain.append("aformat=sample_fmts=fltp:sample_rates=48000:channel_layouts=stereo")
-            audio_filter = f"[{input_idx}:a]{','.join(chain)}[overlay_a{i}]"
-            filter_parts.append(audio_filter)
+            filter_parts.append(build_audio_clip_filter(clip, audio_inputs_start + i, f"[overlay_a{i}]"))
             all_audio_inputs.append(f"[overlay_a{i}]")
     
     # Mix all audio tracks (source + overlay) or use single source
     if len(all_audio_inputs) > 1:
-        mix_filter = f"{''.join(all_audio_inputs)}amix=inputs={len(all_audio_inputs)}:duration=longest:normalize=0[outa]"
+        mix_filter = f"{''.join(all_audio_inputs)}amix=inputs={len(all_audio_inputs)}:duration=longest:normalize=0:dropout_transition=0[outa]"
         filter_parts.append(mix_filter)
         audio_output = "[outa]"
     elif len(all_audio_inputs) == 1:
@@ -1076,12 +2844,10 @@ def build_concat_ffmpeg_command(
         cmd.extend(['-map', audio_output])
     
     # Output settings
-    cmd.extend([
-        '-c:v', 'libx264',
-        '-preset', 'medium',
-        '-crf', '23',
-        '-pix_fmt', 'yuv420p',
-    ])
+    cmd.extend(build_video_encoder_args(
+        encoder, preset, threads,
+        device_frames=gpu_resident and encoder.endswith('_nvenc'),
+    ))
     
     if audio_output:
         cmd.extend([
@@ -1091,6 +2857,7 @@ def build_concat_ffmpeg_command(
     
     # Note: Removed forced -t duration flag to let FFmpeg determine output length
     # from actual concatenated video/audio streams (metadata duration may not match actual file duration)
+    cmd.extend(build_mp4_output_args())
     
     # Output file
     cmd.append(output_path)
@@ -13,29 +13,163 @@ Environment Variables:
 - GCS_BUCKET: Default GCS bucket for outputs (optional, can be in job spec)
 - CALLBACK_URL: URL to POST status updates (optional)
 - RENDER_MODE: 'ken_burns' (default) or 'concatenate' for video segments
+- VIDEO_ENCODER: 'libx264' (default) or a hardware encoder such as 'h264_nvenc'
+- HW_ACCEL: 'cuda' for NVDEC decode + NVENC encode on GPU instances, or 'none' (default);
+  used when the job spec has no hwAccel
+- ASSET_CACHE_DIR: Directory that keeps downloaded gs:// assets across jobs on a warm instance
+  (default /tmp/assets_cache; empty disables the cache)
+- ASSET_CACHE_MAX_MB: Size the asset cache is pruned to after each job (default 2048)
 """
 
 import os
 import sys
-import json
-import time
+import atexit
+import queue
+import logging
+import base64
 import hashlib
+import shutil
+import threading
 import requests
-from typing import Dict, Any, Optional
+import google.auth
+import google_crc32c
+import orjson
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from typing import Dict, Any, List, Optional, Tuple
 from urllib.parse import urlparse
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from google.auth.transport.requests import AuthorizedSession
 from google.cloud import storage
-from ffmpeg_utils import build_ffmpeg_command, build_concat_ffmpeg_command, run_ffmpeg
+from google.cloud.storage import transfer_manager
+from ffmpeg_utils import (
+    RESOLUTIONS, FrameRate, build_and_run, build_concat_ffmpeg_command, build_renditions_command,
+    get_cpu_count, is_remote_input, resolve_video_encoder, run_ffmpeg, stream_output_command,
+    validate_render_shape,
+)
 
 # Constants
 TEMP_DIR = '/tmp'
 ASSETS_DIR = os.path.join(TEMP_DIR, 'assets')
 OUTPUT_DIR = os.path.join(TEMP_DIR, 'output')
 
+# gs:// downloads are kept here (keyed by URL) and hard-linked into ASSETS_DIR, so reruns
+# and back-to-back jobs on a warm instance skip assets they already fetched
+ASSET_CACHE_DIR = os.environ.get('ASSET_CACHE_DIR', os.path.join(TEMP_DIR, 'assets_cache'))
+ASSET_CACHE_MAX_BYTES = int(os.environ.get('ASSET_CACHE_MAX_MB', '2048')) * 1024 * 1024
+
+# hwAccel value -> encoder used when VIDEO_ENCODER is not set
+HW_ACCEL_ENCODERS = {
+    'cuda': 'h264_nvenc',
+}
+
+# Asset downloads are network-bound; fetch up to this many at once
+DOWNLOAD_WORKERS = 32
+
+# Read/write size when streaming a download to disk
+COPY_BUFFER_SIZE = 1024 * 1024
+
+# Files at least this large are fetched as parallel byte ranges (one stream caps throughput)
+PARALLEL_DOWNLOAD_THRESHOLD = 64 * 1024 * 1024
+DOWNLOAD_CHUNK_SIZE = 16 * 1024 * 1024
+DOWNLOAD_CHUNK_WORKERS = 8
+
+# Outputs at least this large are uploaded as parallel multipart chunks
+PARALLEL_UPLOAD_THRESHOLD = 64 * 1024 * 1024
+UPLOAD_CHUNK_SIZE = 32 * 1024 * 1024
+UPLOAD_CHUNK_WORKERS = 8
+
+# Resumable-upload chunk for streamed outputs (a multiple of 256 KiB); bounds the bytes held in memory
+STREAM_UPLOAD_CHUNK_SIZE = 16 * 1024 * 1024
+
+# Local file extension per asset type: (extensions kept from the URL path, default)
+_EXT_MAP = {
+    'image': ({'.jpg', '.jpeg', '.png'}, '.png'),
+    'video': ({'.mp4', '.webm', '.mov'}, '.mp4'),
+    'audio': ({'.mp3', '.wav', '.m4a'}, '.m4a'),
+}
+
+
+logger = logging.getLogger('render')
+
 
 def log(message: str, level: str = 'INFO'):
     """Log message with timestamp."""
-    timestamp = time.strftime('%Y-%m-%d %H:%M:%S')
-    print(f"[{timestamp}] [{level}] {message}")
+    logger.log(getattr(logging, level.upper(), logging.INFO), message)
+
+
+# Shared HTTP session so downloads and callbacks reuse keep-alive TCP/TLS connections.
+# Transient gateway errors are retried with backoff; POST is included because
+# callbacks are idempotent status updates. The last response is returned rather
+# than raised so callers keep their raise_for_status() handling.
+_HTTP_RETRY = Retry(
+    total=3,
+    backoff_factor=0.3,
+    status_forcelist=(502, 503, 504),
+    allowed_methods=frozenset({'GET', 'POST'}),
+    raise_on_status=False,
+)
+_HTTP_SESSION = requests.Session()
+_HTTP_ADAPTER = HTTPAdapter(
+    pool_connections=DOWNLOAD_WORKERS,
+    pool_maxsize=DOWNLOAD_WORKERS,
+    max_retries=_HTTP_RETRY,
+)
+_HTTP_SESSION.mount('http://', _HTTP_ADAPTER)
+_HTTP_SESSION.mount('https://', _HTTP_ADAPTER)
+
+# One GCS client per process: credential discovery and its connection pool are set up once
+_GCS_CLIENT: Optional[storage.Client] = None
+_GCS_CLIENT_LOCK = threading.Lock()
+
+
+# Status callbacks are delivered off the render path by one daemon worker, in order
+_CALLBACK_QUEUE: queue.Queue = queue.Queue()
+_CALLBACK_WORKER: Optional[threading.Thread] = None
+_CALLBACK_LOCK = threading.Lock()
+
+
+def get_gcs_client() -> storage.Client:
+    """Return the shared GCS client, creating it on first use (thread-safe)."""
+    global _GCS_CLIENT
+    if _GCS_CLIENT is None:
+        with _GCS_CLIENT_LOCK:
+            if _GCS_CLIENT is None:
+                credentials, project = google.auth.default(scopes=storage.Client.SCOPE)
+                # Pool sized for concurrent blob downloads (the default keeps 10 connections)
+                session = AuthorizedSession(credentials)
+                session.mount('https://', HTTPAdapter(pool_connections=DOWNLOAD_WORKERS, pool_maxsize=DOWNLOAD_WORKERS))
+                _GCS_CLIENT = storage.Client(project=project, credentials=credentials, _http=session)
+    return _GCS_CLIENT
+
+
+def download_bytes_from_gcs(gcs_path: str) -> Optional[bytes]:
+    """
+    Download a small GCS object straight into memory.
+    
+    Args:
+        gcs_path: GCS URI (gs://bucket/path/to/file)
+    
+    Returns:
+        Object contents, or None on failure
+    """
+    try:
+        if not gcs_path.startswith('gs://'):
+            log(f"Invalid GCS path: {gcs_path}", 'ERROR')
+            return None
+        
+        path_parts = gcs_path[5:].split('/', 1)
+        bucket_name = path_parts[0]
+        blob_name = path_parts[1] if len(path_parts) > 1 else ''
+        
+        data = get_gcs_client().bucket(bucket_name).blob(blob_name).download_as_bytes()
+        log(f"Downloaded: {gcs_path} ({len(data)} bytes)")
+        return data
+        
+    except Exception as e:
+        log(f"Failed to download {gcs_path}: {e}", 'ERROR')
+        return None
 
 
 def download_from_gcs(gcs_path: str, local_path: str) -> bool:
@@ -59,14 +193,24 @@ def download_from_gcs(gcs_path: str, local_path: str) -> bool:
         bucket_name = path_parts[0]
         blob_name = path_parts[1] if len(path_parts) > 1 else ''
         
-        client = storage.Client()
+        client = get_gcs_client()
         bucket = client.bucket(bucket_name)
         blob = bucket.blob(blob_name)
         
         # Ensure directory exists
         os.makedirs(os.path.dirname(local_path), exist_ok=True)
         
-        blob.download_to_filename(local_path)
+        blob.reload()
+        if blob.size and blob.size >= PARALLEL_DOWNLOAD_THRESHOLD:
+            # Threads, not processes: the workers share the client's authorized session
+            transfer_manager.download_chunks_concurrently(
+                blob, local_path,
+                chunk_size=DOWNLOAD_CHUNK_SIZE,
+                worker_type=transfer_manager.THREAD,
+                max_workers=DOWNLOAD_CHUNK_WORKERS,
+            )
+        else:
+            blob.download_to_filename(local_path)
         log(f"Downloaded: {gcs_path} -> {local_path}")
         return True
         
@@ -90,12 +234,24 @@ def download_from_url(url: str, local_path: str) -> bool:
         # Ensure directory exists
         os.makedirs(os.path.dirname(local_path), exist_ok=True)
         
-        response = requests.get(url, stream=True, timeout=60)
+        response = _HTTP_SESSION.get(url, stream=True, timeout=60)
         response.raise_for_status()
         
+        size = int(response.headers.get('Content-Length') or 0)
+        if (
+            size >= PARALLEL_DOWNLOAD_THRESHOLD
+            and response.headers.get('Accept-Ranges') == 'bytes'
+            and not response.headers.get('Content-Encoding')
+        ):
+            response.close()
+            download_url_ranges(url, local_path, size)
+            log(f"Downloaded: {url[:60]}... -> {local_path} ({size} bytes in ranges)")
+            return True
+        
+        # Let urllib3 undo any Content-Encoding, then copy in 1 MiB blocks outside a Python loop
+        response.raw.decode_content = True
         with open(local_path, 'wb') as f:
-            for chunk in response.iter_content(chunk_size=8192):
-                f.write(chunk)
+            shutil.copyfileobj(response.raw, f, length=COPY_BUFFER_SIZE)
         
         log(f"Downloaded: {url[:60]}... -> {local_path}")
         return True
@@ -105,51 +261,241 @@ def download_from_url(url: str, local_path: str) -> bool:
         return False
 
 
+def download_url_ranges(url: str, local_path: str, size: int):
+    """
+    Download a file as concurrent Range requests written in place at their offsets.
+    
+    Raises:
+        requests.RequestException or IOError if any range fails or comes back short
+    """
+    fd = os.open(local_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    try:
+        # Reserve the whole file up front so concurrent writes don't fragment it
+        try:
+            os.posix_fallocate(fd, 0, size)
+        except (AttributeError, OSError):
+            os.ftruncate(fd, size)
+        
+        def fetch_range(start: int):
+            end = min(start + DOWNLOAD_CHUNK_SIZE, size) - 1
+            response = _HTTP_SESSION.get(
+                url, headers={'Range': f'bytes={start}-{end}'}, stream=True, timeout=60,
+            )
+            response.raise_for_status()
+            if response.status_code != 206:
+                raise IOError(f"Range request for bytes {start}-{end} returned {response.status_code}")
+            offset = start
+            for chunk in response.iter_content(chunk_size=COPY_BUFFER_SIZE):
+                os.pwrite(fd, chunk, offset)
+                offset += len(chunk)
+            if offset != end + 1:
+                raise IOError(f"Range {start}-{end} ended at byte {offset}")
+        
+        with ThreadPoolExecutor(max_workers=DOWNLOAD_CHUNK_WORKERS) as pool:
+            # list() re-raises the first failed range
+            list(pool.map(fetch_range, range(0, size, DOWNLOAD_CHUNK_SIZE)))
+    finally:
+        os.close(fd)
+
+
+def file_crc32c(path: str) -> str:
+    """Base64 CRC32C of a file, in the form GCS reports for blobs."""
+    checksum = google_crc32c.Checksum()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(COPY_BUFFER_SIZE), b''):
+            checksum.update(block)
+    return base64.b64encode(checksum.digest()).decode('ascii')
+
+
+def is_cached_asset_current(url: str, cache_path: str) -> bool:
+    """
+    True when a cached copy of gs:// url can be reused.
+    
+    Objects can be overwritten in place, so the cached copy must still match the blob's
+    size and CRC32C; the file is only hashed once its size matches.
+    """
+    if not url.startswith('gs://') or not os.path.isfile(cache_path):
+        return False
+    size = os.path.getsize(cache_path)
+    if size == 0:
+        return False
+    try:
+        path_parts = url[5:].split('/', 1)
+        blob = get_gcs_client().bucket(path_parts[0]).get_blob(path_parts[1] if len(path_parts) > 1 else '')
+        if blob is None or blob.size != size:
+            return False
+        return blob.crc32c == file_crc32c(cache_path)
+    except Exception as e:
+        log(f"Could not validate cached {url}: {e}", 'WARN')
+        return False
+
+
+def copy_file_sendfile(src: str, dst: str):
+    """Copy src to dst with os.sendfile, so the bytes go kernel-to-kernel without a userspace buffer."""
+    with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+        size = os.fstat(fsrc.fileno()).st_size
+        offset = 0
+        while offset < size:
+            sent = os.sendfile(fdst.fileno(), fsrc.fileno(), offset, size - offset)
+            if sent == 0:
+                break
+            offset += sent
+
+
+def link_asset(src: str, dst: str):
+    """Hard-link src to dst, replacing any existing dst; across filesystems, copy with sendfile."""
+    if os.path.lexists(dst):
+        os.remove(dst)
+    try:
+        os.link(src, dst)
+    except OSError:
+        try:
+            copy_file_sendfile(src, dst)
+        except OSError:
+            shutil.copyfile(src, dst)
+
+
+def prune_asset_cache(max_bytes: int = ASSET_CACHE_MAX_BYTES):
+    """Delete the least recently used cached assets until the cache fits in max_bytes."""
+    if not ASSET_CACHE_DIR or not os.path.isdir(ASSET_CACHE_DIR):
+        return
+    entries = []
+    for entry in os.scandir(ASSET_CACHE_DIR):
+        if entry.is_file(follow_symlinks=False):
+            st = entry.stat()
+            entries.append((st.st_mtime, st.st_size, entry.path))
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+            total -= size
+        except OSError:
+            pass
+
+
+def asset_filename(url: str, asset_type: str, index: int) -> str:
+    """
+    Local filename (relative to ASSETS_DIR) that download_asset saves an asset under.
+    
+    Args:
+        url: Asset URL (GCS, HTTP, or HTTPS)
+        asset_type: 'image', 'video', or 'audio'
+        index: Index for naming
+    """
+    # Generate deterministic filename from URL
+    url_hash = hashlib.blake2b(url.encode(), digest_size=4).hexdigest()
+    
+    # Determine file extension from the URL path's suffix, falling back per asset type
+    allowed, default = _EXT_MAP.get(asset_type, _EXT_MAP['audio'])
+    ext = os.path.splitext(urlparse(url).path)[1].lower()
+    if ext not in allowed:
+        ext = default
+    
+    return f"{asset_type}_{index:03d}_{url_hash}{ext}"
+
+
 def download_asset(url: str, asset_type: str, index: int) -> Optional[str]:
     """
     Download an asset (image, video, or audio) from URL or GCS.
     
+    gs:// assets are kept in ASSET_CACHE_DIR and reused while they match the blob;
+    http(s) URLs carry nothing to validate a cached copy against, so they are always fetched.
+    
     Args:
         url: Asset URL (GCS, HTTP, or HTTPS)
         asset_type: 'image', 'video', or 'audio'
         index: Index for naming
     
     Returns:
-        Local filename (relative to ASSETS_DIR) or None if failed
+        Local filename (relative to ASSETS_DIR, see asset_filename) or None if failed
     """
-    # Generate deterministic filename from URL
-    url_hash = hashlib.md5(url.encode()).hexdigest()[:8]
-    
-    # Determine file extension based on asset type
-    parsed = urlparse(url)
-    path = parsed.path.lower()
+    filename = asset_filename(url, asset_type, index)
+    ext = os.path.splitext(filename)[1]
+    local_path = os.path.join(ASSETS_DIR, filename)
     
-    if asset_type == 'image':
-        ext = '.jpg' if '.jpg' in path or '.jpeg' in path else '.png'
-    elif asset_type == 'video':
-        ext = '.mp4' if '.mp4' in path else '.webm' if '.webm' in path else '.mov' if '.mov' in path else '.mp4'
-    else:  # audio
-        ext = '.mp3' if '.mp3' in path else '.wav' if '.wav' in path else '.m4a'
+    if not ASSET_CACHE_DIR or not url.startswith('gs://'):
+        return filename if fetch_asset(url, local_path) else None
     
-    filename = f"{asset_type}_{index:03d}_{url_hash}{ext}"
-    local_path = os.path.join(ASSETS_DIR, filename)
+    # Full-length key: the cache outlives a single job, so short hashes could collide
+    cache_path = os.path.join(ASSET_CACHE_DIR, hashlib.blake2b(url.encode(), digest_size=16).hexdigest() + ext)
+    if is_cached_asset_current(url, cache_path):
+        os.utime(cache_path)  # most recently used, for prune_asset_cache
+        log(f"Cached: {url[:60]}... -> {local_path}")
+    else:
+        # Download beside the cache entry, then rename: readers never see a partial file
+        os.makedirs(ASSET_CACHE_DIR, exist_ok=True)
+        part_path = f"{cache_path}.{os.getpid()}.{threading.get_ident()}.part"
+        if not fetch_asset(url, part_path):
+            if os.path.exists(part_path):
+                os.remove(part_path)
+            return None
+        os.replace(part_path, cache_path)
     
-    # Download based on URL type
+    os.makedirs(ASSETS_DIR, exist_ok=True)
+    link_asset(cache_path, local_path)
+    return filename
+
+
+def fetch_asset(url: str, local_path: str) -> bool:
+    """Download url (GCS or HTTP/HTTPS) to local_path."""
     if url.startswith('gs://'):
-        success = download_from_gcs(url, local_path)
-    else:
-        success = download_from_url(url, local_path)
+        return download_from_gcs(url, local_path)
+    return download_from_url(url, local_path)
+
+
+def download_assets(assets: List[Tuple[str, str, int]]) -> List[Optional[str]]:
+    """
+    Download several assets concurrently.
+    
+    Args:
+        assets: (url, asset_type, index) tuples, as passed to download_asset
     
-    return filename if success else None
+    Returns:
+        Local filenames in the same order as assets (None where a download failed)
+    """
+    if not assets:
+        return []
+    with ThreadPoolExecutor(max_workers=min(DOWNLOAD_WORKERS, len(assets))) as pool:
+        return list(pool.map(lambda asset: download_asset(*asset), assets))
 
 
-def upload_to_gcs(local_path: str, gcs_path: str) -> bool:
+def download_audio_clips(audio_clips: list) -> list:
+    """
+    Download overlay audio clips concurrently, setting each clip's localFile.
+    
+    Clips without a URL or whose download fails are skipped with a warning.
+    
+    Returns:
+        The audio clips that have a local file
+    """
+    clip_indices = []
+    for i, clip in enumerate(audio_clips):
+        if clip.get('url', ''):
+            clip_indices.append(i)
+        else:
+            log(f"Audio clip {i} has no URL, skipping", 'WARN')
+    
+    local_files = download_assets([(audio_clips[i]['url'], 'audio', i) for i in clip_indices])
+    for i, local_file in zip(clip_indices, local_files):
+        if local_file:
+            audio_clips[i]['localFile'] = local_file
+        else:
+            log(f"Failed to download audio clip {i}, continuing without it", 'WARN')
+    
+    # Filter out audio clips without local files
+    return [c for c in audio_clips if c.get('localFile')]
+
+
+def upload_to_gcs(local_path: str, gcs_path: str, content_type: str = 'video/mp4') -> bool:
     """
     Upload file from local path to GCS.
     
     Args:
         local_path: Local file path
         gcs_path: GCS URI (gs://bucket/path/to/file)
+        content_type: MIME type stored on the object (set explicitly, not guessed)
     
     Returns:
         True if successful, False otherwise
@@ -164,11 +510,29 @@ def upload_to_gcs(local_path: str, gcs_path: str) -> bool:
         bucket_name = path_parts[0]
         blob_name = path_parts[1] if len(path_parts) > 1 else ''
         
-        client = storage.Client()
+        client = get_gcs_client()
         bucket = client.bucket(bucket_name)
         blob = bucket.blob(blob_name)
         
-        blob.upload_from_filename(local_path)
+        if os.path.getsize(local_path) >= PARALLEL_UPLOAD_THRESHOLD:
+            # XML multipart upload; thread workers share the client's authorized session.
+            # Only the parts are checksummed, so hash the whole file while it uploads and
+            # compare against the CRC32C GCS computed for the assembled object.
+            with ThreadPoolExecutor(max_workers=1) as pool:
+                local_crc32c = pool.submit(file_crc32c, local_path)
+                transfer_manager.upload_chunks_concurrently(
+                    local_path, blob,
+                    content_type=content_type,
+                    chunk_size=UPLOAD_CHUNK_SIZE,
+                    worker_type=transfer_manager.THREAD,
+                    max_workers=UPLOAD_CHUNK_WORKERS,
+                )
+                blob.reload()
+                if blob.crc32c != local_crc32c.result():
+                    log(f"CRC32C mismatch after upload: {gcs_path}", 'ERROR')
+                    return False
+        else:
+            blob.upload_from_filename(local_path, content_type=content_type)
         log(f"Uploaded: {local_path} -> {gcs_path}")
         return True
         
@@ -177,6 +541,38 @@ def upload_to_gcs(local_path: str, gcs_path: str) -> bool:
         return False
 
 
+def upload_stream_to_gcs(stream, gcs_path: str, content_type: str = 'video/mp4') -> None:
+    """
+    Upload a non-seekable stream (FFmpeg's stdout) to GCS as it is produced.
+    
+    Sent as a resumable upload in STREAM_UPLOAD_CHUNK_SIZE chunks; the object is
+    only finalized when the stream ends cleanly. Raises on failure.
+    """
+    path_parts = gcs_path[5:].split('/', 1)
+    bucket_name = path_parts[0]
+    blob_name = path_parts[1]
+    
+    blob = get_gcs_client().bucket(bucket_name).blob(blob_name, chunk_size=STREAM_UPLOAD_CHUNK_SIZE)
+    blob.upload_from_file(stream, content_type=content_type, rewind=False)
+    log(f"Uploaded stream -> {gcs_path} ({stream.tell()} bytes)")
+
+
+def run_render_command(ffmpeg_cmd: List[str], output_path_gcs: str, stream_upload: bool = False) -> bool:
+    """
+    Run the final FFmpeg command (up to 2 hours for long videos).
+    
+    With stream_upload the output is written as fragmented MP4 to stdout and
+    uploaded to output_path_gcs while FFmpeg is still encoding.
+    """
+    if not stream_upload:
+        return run_ffmpeg(ffmpeg_cmd, timeout=7200)
+    log(f"Streaming output to {output_path_gcs} as fragmented MP4")
+    return run_ffmpeg(
+        stream_output_command(ffmpeg_cmd), timeout=7200,
+        stdout_sink=lambda stream: upload_stream_to_gcs(stream, output_path_gcs),
+    )
+
+
 def send_callback(
     callback_url: str,
     job_id: str,
@@ -186,7 +582,11 @@ def send_callback(
     error: Optional[str] = None,
 ):
     """
-    Send status update to callback URL.
+    Queue a status update for the callback URL and return immediately.
+    
+    A single background worker POSTs updates in order, so a slow callback
+    endpoint never holds up the render; failures are logged. Queued updates
+    are flushed before the process exits (see flush_callbacks).
     
     Args:
         callback_url: URL to POST status to
@@ -199,31 +599,66 @@ def send_callback(
     if not callback_url:
         return
     
-    try:
-        payload = {
-            'jobId': job_id,
-            'status': status,
-            'progress': progress,
-        }
-        if output_url:
-            payload['outputUrl'] = output_url
-        if error:
-            payload['error'] = error
-        
-        response = requests.post(
-            callback_url,
-            json=payload,
-            headers={'Content-Type': 'application/json'},
-            timeout=10,
-        )
-        log(f"Callback sent: {status} ({progress}%)")
-        
-    except Exception as e:
-        log(f"Callback failed: {e}", 'WARN')
+    payload = {
+        'jobId': job_id,
+        'status': status,
+        'progress': progress,
+    }
+    if output_url:
+        payload['outputUrl'] = output_url
+    if error:
+        payload['error'] = error
+    
+    start_callback_worker()
+    _CALLBACK_QUEUE.put((callback_url, payload))
+
+
+def _callback_worker():
+    """Worker-thread body: POST queued callbacks in order; failures are logged, never raised."""
+    while True:
+        callback_url, payload = _CALLBACK_QUEUE.get()
+        try:
+            _HTTP_SESSION.post(
+                callback_url,
+                json=payload,
+                headers={'Content-Type': 'application/json'},
+                timeout=10,
+            )
+            log(f"Callback sent: {payload['status']} ({payload['progress']}%)")
+        except Exception as e:
+            log(f"Callback failed: {e}", 'WARN')
+        finally:
+            _CALLBACK_QUEUE.task_done()
+
+
+def start_callback_worker():
+    """Start the callback worker on first use (thread-safe)."""
+    global _CALLBACK_WORKER
+    if _CALLBACK_WORKER is None:
+        with _CALLBACK_LOCK:
+            if _CALLBACK_WORKER is None:
+                _CALLBACK_WORKER = threading.Thread(target=_callback_worker, name='callbacks', daemon=True)
+                _CALLBACK_WORKER.start()
+
+
+def flush_callbacks():
+    """Block until every queued callback has been sent (or has failed)."""
+    if _CALLBACK_WORKER is not None:
+        _CALLBACK_QUEUE.join()
+
+
+# Callbacks queued by send_callback may not outlive the job, including sys.exit(1) paths
+atexit.register(flush_callbacks)
 
 
 def main():
     """Main render pipeline."""
+    logging.basicConfig(
+        level=logging.INFO,
+        format='[%(asctime)s] [%(levelname)s] %(message)s',
+        datefmt='%Y-%m-%d %H:%M:%S',
+        stream=sys.stdout,
+    )
     log("=== SceneFlow FFmpeg Renderer Started ===")
     
     # Get job spec path from environment
@@ -237,26 +672,28 @@ def main():
     # Get render mode from environment or job spec
     render_mode_env = os.environ.get('RENDER_MODE', '')
     
+    hw_accel_env = os.environ.get('HW_ACCEL', '')
+    encoder_env = os.environ.get('VIDEO_ENCODER', '')
+    
     # Create directories
     os.makedirs(ASSETS_DIR, exist_ok=True)
     os.makedirs(OUTPUT_DIR, exist_ok=True)
     
-    # Download job spec
+    # Download job spec into memory (no temp file round trip)
     log(f"Downloading job spec from: {job_spec_path}")
-    job_spec_local = os.path.join(TEMP_DIR, 'job_spec.json')
+    job_spec_data = download_bytes_from_gcs(job_spec_path)
     
-    if not download_from_gcs(job_spec_path, job_spec_local):
+    if job_spec_data is None:
         log("Failed to download job spec", 'ERROR')
         sys.exit(1)
     
     # Parse job spec
-    with open(job_spec_local, 'r') as f:
-        job_spec = json.load(f)
+    job_spec = orjson.loads(job_spec_data)
     
     job_id = job_spec.get('jobId', 'unknown')
     project_id = job_spec.get('projectId', 'unknown')
-    resolution = job_spec.get('resolution', '1080p')
-    fps = job_spec.get('fps', 24)
+    # Validated once up front: every command builder below sees the same normalized shape
+    resolution, fps = validate_render_shape(job_spec.get('resolution', '1080p'), job_spec.get('fps', 24))
     audio_clips = job_spec.get('audioClips', [])
     output_path_gcs = job_spec.get('outputPath', '')
     
@@ -264,16 +701,57 @@ def main():
     # Priority: ENV > job_spec > default
     render_mode = render_mode_env or job_spec.get('renderMode', 'ken_burns')
     
+    # Hardware acceleration: job_spec > ENV (the image's default) > none
+    hw_accel = (job_spec.get('hwAccel') or hw_accel_env or 'none').lower()
+    hwaccel = hw_accel if hw_accel in HW_ACCEL_ENCODERS else None
+    
+    # Falls back to libx264 when the encoder is missing from the ffmpeg build
+    encoder = encoder_env or HW_ACCEL_ENCODERS.get(hw_accel, 'libx264')
+    
+    # GPU decode needs the same device as its encoder; without it, decode on the CPU too
+    if hwaccel and resolve_video_encoder(HW_ACCEL_ENCODERS[hwaccel]) != HW_ACCEL_ENCODERS[hwaccel]:
+        log(f"{hwaccel} requested but {HW_ACCEL_ENCODERS[hwaccel]} is unusable here; decoding on the CPU", 'WARN')
+        hwaccel = None
+    
+    # FFmpeg thread count: job_spec, else every CPU the container may use (cgroup quota aware)
+    threads = job_spec.get('threads')
+    if not isinstance(threads, int) or isinstance(threads, bool) or threads < 1:
+        threads = None
+    
+    # Extra renditions transcoded from the finished render: outputs other than outputPath
+    extra_outputs = []
+    for output in job_spec.get('outputs') or []:
+        output_resolution, output_path = output.get('resolution'), output.get('path', '')
+        if not output_path or output_path == output_path_gcs:
+            continue
+        if output_resolution not in RESOLUTIONS or not output_path.startswith('gs://'):
+            log(f"Skipping invalid output: {output}", 'WARN')
+            continue
+        extra_outputs.append((output_resolution, output_path))
+    
+    # Streamed upload needs a gs:// target; extra outputs are transcoded from the local file
+    stream_upload = (
+        bool(job_spec.get('streamUpload', False))
+        and output_path_gcs.startswith('gs://')
+        and not extra_outputs
+    )
+    
     log(f"Job ID: {job_id}")
     log(f"Project ID: {project_id}")
     log(f"Resolution: {resolution}")
+    if extra_outputs:
+        log(f"Extra Outputs: {', '.join(res for res, _ in extra_outputs)}")
     log(f"Render Mode: {render_mode}")
+    log(f"Hardware Acceleration: {hwaccel or 'none'}")
+    log(f"Video Encoder: {encoder}")
+    log(f"FFmpeg Threads: {threads or f'auto ({get_cpu_count()} CPUs)'}")
     
     # Route to appropriate render function
     if render_mode == 'stitch':
         clip_urls = job_spec.get('clipUrls', [])
         log(f"Stitch clips: {len(clip_urls)}")
-        render_stitch_clips(job_id, clip_urls, output_path_gcs, resolution, fps, callback_url)
+        render_stitch_clips(job_id, clip_urls, output_path_gcs, resolution, fps, callback_url, encoder, hwaccel,
+                            threads=threads, extra_outputs=extra_outputs, stream_upload=stream_upload)
     elif render_mode == 'concatenate':
         # Video concatenation mode (for scene renders)
         video_segments = job_spec.get('videoSegments', [])
@@ -281,6 +759,7 @@ def main():
         segment_audio_volume = job_spec.get('segmentAudioVolume', 1.0)
         text_overlays = job_spec.get('textOverlays', [])
         watermark = job_spec.get('watermark')
+        stream_inputs = bool(job_spec.get('streamInputs', False))
         log(f"Video Segments: {len(video_segments)}")
         
         # Debug: Log per-segment audio settings from job spec
@@ -296,6 +775,8 @@ def main():
         log(f"Include Segment Audio: {include_segment_audio}")
         log(f"Segment Audio Volume: {segment_audio_volume}")
         log(f"Text Overlays: {len(text_overlays)}")
+        log(f"Stream Inputs: {stream_inputs}")
+        log(f"Stream Upload: {stream_upload}")
         log(f"Watermark: {'enabled' if watermark else 'disabled'}")
         if watermark:
             log(f"  Watermark type: {watermark.get('type')}")
@@ -303,18 +784,23 @@ def main():
             log(f"  Watermark anchor: {watermark.get('anchor')}")
         render_video_concatenation(job_id, video_segments, audio_clips, output_path_gcs, 
                                    resolution, fps, callback_url, include_segment_audio, segment_audio_volume,
-                                   text_overlays, watermark)
+                                   text_overlays, watermark, encoder, hwaccel, stream_inputs,
+                                   threads=threads, extra_outputs=extra_outputs,
+                                   stream_upload=stream_upload)
     else:
         # Ken Burns mode (for project renders with images)
         segments = job_spec.get('segments', [])
         log(f"Image Segments: {len(segments)}")
         log(f"Audio clips: {len(audio_clips)}")
         render_ken_burns(job_id, segments, audio_clips, output_path_gcs, 
-                         resolution, fps, callback_url)
+                         resolution, fps, callback_url, encoder, threads=threads,
+                         extra_outputs=extra_outputs)
 
 
 def render_ken_burns(job_id: str, segments: list, audio_clips: list, 
-                     output_path_gcs: str, resolution: str, fps: int, callback_url: str):
+                     output_path_gcs: str, resolution: str, fps: FrameRate, callback_url: str,
+                     encoder: str = 'libx264', threads: Optional[int] = None,
+                     extra_outputs: Optional[List[Tuple[str, str]]] = None):
     """Render with Ken Burns effect on images (original behavior)."""
     
     # Send processing status
@@ -325,37 +811,33 @@ def render_ken_burns(job_id: str, segments: list, audio_clips: list,
     
     # Download images
     for i, segment in enumerate(segments):
-        image_url = segment.get('imageUrl', '')
-        if not image_url:
+        if not segment.get('imageUrl', ''):
             log(f"Segment {i} has no imageUrl", 'ERROR')
             send_callback(callback_url, job_id, 'FAILED', 0, error=f"Segment {i} missing image")
             sys.exit(1)
-        
-        local_file = download_asset(image_url, 'image', i)
-        if not local_file:
-            log(f"Failed to download image for segment {i}", 'ERROR')
-            send_callback(callback_url, job_id, 'FAILED', 0, error=f"Failed to download image {i}")
-            sys.exit(1)
-        
-        segment['localFile'] = local_file
     
-    send_callback(callback_url, job_id, 'PROCESSING', 30)
+    # Images keep downloading in the background: each render chunk starts as soon as
+    # its own images are in, so encoding overlaps the rest of the downloads
+    for i, segment in enumerate(segments):
+        segment['localFile'] = asset_filename(segment['imageUrl'], 'image', i)
+    image_pool = ThreadPoolExecutor(max_workers=max(1, min(DOWNLOAD_WORKERS, len(segments))))
+    image_downloads = [
+        image_pool.submit(download_asset, segment['imageUrl'], 'image', i)
+        for i, segment in enumerate(segments)
+    ]
+    
+    def image_ready(i: int) -> Optional[bool]:
+        """Render gate for segment i: None while downloading, then whether it succeeded."""
+        download = image_downloads[i]
+        if not download.done() or download.cancelled():
+            # Cancelled downloads were never needed (the render already ended).
+            return None
+        return download.exception() is None and download.result() is not None
     
-    # Download audio
-    for i, clip in enumerate(audio_clips):
-        audio_url = clip.get('url', '')
-        if not audio_url:
-            log(f"Audio clip {i} has no URL, skipping", 'WARN')
-            continue
-        
-        local_file = download_asset(audio_url, 'audio', i)
-        if local_file:
-            clip['localFile'] = local_file
-        else:
-            log(f"Failed to download audio clip {i}, continuing without it", 'WARN')
+    send_callback(callback_url, job_id, 'PROCESSING', 30)
     
-    # Filter out audio clips without local files
-    audio_clips_with_files = [c for c in audio_clips if c.get('localFile')]
+    # Download audio (the stitch needs it up front; images continue meanwhile)
+    audio_clips_with_files = download_audio_clips(audio_clips)
     
     send_callback(callback_url, job_id, 'PROCESSING', 50)
     
@@ -363,20 +845,30 @@ def render_ken_burns(job_id: str, segments: list, audio_clips: list,
     log("=== Starting FFmpeg Render (Ken Burns) ===")
     output_file = os.path.join(OUTPUT_DIR, f"{job_id}.mp4")
     
-    ffmpeg_cmd = build_ffmpeg_command(
-        segments=segments,
-        audio_clips=audio_clips_with_files,
-        output_path=output_file,
-        resolution=resolution,
-        fps=fps,
-        temp_dir=TEMP_DIR,
-    )
-    
-    log(f"FFmpeg command length: {len(ffmpeg_cmd)} args")
     send_callback(callback_url, job_id, 'PROCESSING', 60)
     
     # Run FFmpeg (allow up to 2 hours for long videos)
-    success = run_ffmpeg(ffmpeg_cmd, timeout=7200)
+    try:
+        success = build_and_run(
+            segments=segments,
+            audio_clips=audio_clips_with_files,
+            output_path=output_file,
+            resolution=resolution,
+            fps=fps,
+            temp_dir=TEMP_DIR,
+            encoder=encoder,
+            timeout=7200,
+            threads=threads,
+            segment_ready=image_ready,
+        )
+    finally:
+        image_pool.shutdown(wait=False, cancel_futures=True)
+    
+    failed_image = next((i for i in range(len(segments)) if image_ready(i) is False), None)
+    if failed_image is not None:
+        log(f"Failed to download image for segment {failed_image}", 'ERROR')
+        send_callback(callback_url, job_id, 'FAILED', 0, error=f"Failed to download image {failed_image}")
+        sys.exit(1)
     
     if not success:
         log("FFmpeg render failed", 'ERROR')
@@ -384,14 +876,27 @@ def render_ken_burns(job_id: str, segments: list, audio_clips: list,
         sys.exit(1)
     
     # Upload and finish
-    finish_render(job_id, output_file, output_path_gcs, callback_url)
+    finish_render(job_id, output_file, output_path_gcs, callback_url,
+                  extra_outputs, encoder, None, threads)
 
 
 def render_video_concatenation(job_id: str, video_segments: list, audio_clips: list,
-                               output_path_gcs: str, resolution: str, fps: int, callback_url: str,
+                               output_path_gcs: str, resolution: str, fps: FrameRate, callback_url: str,
                                include_segment_audio: bool = True, segment_audio_volume: float = 1.0,
-                               text_overlays: list = None, watermark: dict = None):
-    """Render by concatenating video segments with audio mixing, text overlays, and watermark."""
+                               text_overlays: list = None, watermark: dict = None,
+                               encoder: str = 'libx264', hwaccel: Optional[str] = None,
+                               stream_inputs: bool = False, threads: Optional[int] = None,
+                               extra_outputs: Optional[List[Tuple[str, str]]] = None,
+                               stream_upload: bool = False):
+    """
+    Render by concatenating video segments with audio mixing, text overlays, and watermark.
+    
+    With stream_inputs, http(s) video segments are not downloaded: FFmpeg reads them
+    from their URLs, so decoding starts while the bytes arrive and nothing is staged
+    in /tmp. gs:// segments are always downloaded.
+    
+    With stream_upload the output is uploaded while it encodes (see run_render_command).
+    """
     
     if text_overlays is None:
         text_overlays = []
@@ -402,15 +907,43 @@ def render_video_concatenation(job_id: str, video_segments: list, audio_clips: l
     # Download all assets
     log("=== Downloading Assets (Concatenation Mode) ===")
     
-    # Download video segments
+    # Download video segments, together with voiceover audio for segments that use it
     for i, segment in enumerate(video_segments):
-        video_url = segment.get('videoUrl', '')
-        if not video_url:
+        if not segment.get('videoUrl', ''):
             log(f"Video segment {i} has no videoUrl", 'ERROR')
             send_callback(callback_url, job_id, 'FAILED', 0, error=f"Segment {i} missing video")
             sys.exit(1)
-        
-        local_file = download_asset(video_url, 'video', i)
+    
+    voiceover_segments = [
+        i for i, segment in enumerate(video_segments)
+        if segment.get('audioSource', 'original') == 'voiceover' and segment.get('voiceoverUrl', '')
+    ]
+    streamed_segments = {
+        i for i, segment in enumerate(video_segments)
+        if stream_inputs and is_remote_input(segment['videoUrl'])
+    }
+    download_segments = [i for i in range(len(video_segments)) if i not in streamed_segments]
+    
+    # Overlay audio and the watermark image download alongside the video batch
+    side_pool = ThreadPoolExecutor(max_workers=2)
+    audio_download = side_pool.submit(download_audio_clips, audio_clips)
+    wm_download = None
+    if watermark and watermark.get('type') == 'image' and watermark.get('imageUrl'):
+        wm_download = side_pool.submit(download_asset, watermark['imageUrl'], 'image', 997)
+    side_pool.shutdown(wait=False)
+    
+    downloaded = download_assets(
+        [(video_segments[i]['videoUrl'], 'video', i) for i in download_segments]
+        + [(video_segments[i]['voiceoverUrl'], 'voiceover', i) for i in voiceover_segments]
+    )
+    video_files = dict(zip(download_segments, downloaded[:len(download_segments)]))
+    video_files.update((i, video_segments[i]['videoUrl']) for i in streamed_segments)
+    voiceover_files = dict(zip(voiceover_segments, downloaded[len(download_segments):]))
+    if streamed_segments:
+        log(f"Streaming {len(streamed_segments)} video segments from their URLs")
+    
+    for i, segment in enumerate(video_segments):
+        local_file = video_files[i]
         if not local_file:
             log(f"Failed to download video for segment {i}", 'ERROR')
             send_callback(callback_url, job_id, 'FAILED', 0, error=f"Failed to download video {i}")
@@ -418,11 +951,8 @@ def render_video_concatenation(job_id: str, video_segments: list, audio_clips: l
         
         segment['localFile'] = local_file
         
-        # Download voiceover audio if segment uses voiceover audio source
-        audio_source = segment.get('audioSource', 'original')
-        voiceover_url = segment.get('voiceoverUrl', '')
-        if audio_source == 'voiceover' and voiceover_url:
-            voiceover_file = download_asset(voiceover_url, 'voiceover', i)
+        if i in voiceover_files:
+            voiceover_file = voiceover_files[i]
             if voiceover_file:
                 segment['voiceoverLocalFile'] = voiceover_file
                 log(f"Downloaded voiceover for segment {i}")
@@ -433,27 +963,14 @@ def render_video_concatenation(job_id: str, video_segments: list, audio_clips: l
     log(f"Downloaded {len(video_segments)} video segments")
     send_callback(callback_url, job_id, 'PROCESSING', 30)
     
-    # Download audio
-    for i, clip in enumerate(audio_clips):
-        audio_url = clip.get('url', '')
-        if not audio_url:
-            log(f"Audio clip {i} has no URL, skipping", 'WARN')
-            continue
-        
-        local_file = download_asset(audio_url, 'audio', i)
-        if local_file:
-            clip['localFile'] = local_file
-        else:
-            log(f"Failed to download audio clip {i}, continuing without it", 'WARN')
-    
-    # Filter out audio clips without local files
-    audio_clips_with_files = [c for c in audio_clips if c.get('localFile')]
+    # Collect audio (downloaded while the videos were)
+    audio_clips_with_files = audio_download.result()
     log(f"Downloaded {len(audio_clips_with_files)} audio clips")
     
-    # Download image watermark asset (text watermarks need no extra file)
+    # Collect image watermark asset (text watermarks need no extra file)
     wm_for_cmd = watermark
-    if watermark and watermark.get('type') == 'image' and watermark.get('imageUrl'):
-        wm_file = download_asset(watermark['imageUrl'], 'image', 997)
+    if wm_download is not None:
+        wm_file = wm_download.result()
         if wm_file:
             wm_for_cmd = dict(watermark)
             wm_for_cmd['localFile'] = wm_file
@@ -486,13 +1003,16 @@ def render_video_concatenation(job_id: str, video_segments: list, audio_clips: l
         segment_audio_volume=segment_audio_volume,
         text_overlays=text_overlays,
         watermark=wm_for_cmd,
+        encoder=encoder,
+        hwaccel=hwaccel,
+        threads=threads,
     )
     
     log(f"FFmpeg command length: {len(ffmpeg_cmd)} args")
     send_callback(callback_url, job_id, 'PROCESSING', 60)
     
     # Run FFmpeg (allow up to 2 hours for long videos)
-    success = run_ffmpeg(ffmpeg_cmd, timeout=7200)
+    success = run_render_command(ffmpeg_cmd, output_path_gcs, stream_upload)
     
     if not success:
         log("FFmpeg render failed", 'ERROR')
@@ -500,11 +1020,40 @@ def render_video_concatenation(job_id: str, video_segments: list, audio_clips: l
         sys.exit(1)
     
     # Upload and finish
-    finish_render(job_id, output_file, output_path_gcs, callback_url)
+    finish_render(job_id, output_file, output_path_gcs, callback_url,
+                  extra_outputs, encoder, hwaccel, threads, uploaded=stream_upload)
 
 
-def finish_render(job_id: str, output_file: str, output_path_gcs: str, callback_url: str):
-    """Common finishing steps: upload to GCS and cleanup."""
+def sign_gcs_url(gcs_path: str) -> str:
+    """Signed download URL for a GCS object (valid 7 days); falls back to the gs:// path."""
+    try:
+        path_parts = gcs_path[5:].split('/', 1)
+        bucket_name = path_parts[0]
+        blob_name = path_parts[1]
+        
+        blob = get_gcs_client().bucket(bucket_name).blob(blob_name)
+        
+        return blob.generate_signed_url(
+            version="v4",
+            expiration=timedelta(days=7),
+            method="GET",
+        )
+    except Exception as e:
+        log(f"Failed to generate signed URL: {e}", 'WARN')
+        return gcs_path
+
+
+def finish_render(job_id: str, output_file: str, output_path_gcs: str, callback_url: str,
+                  extra_outputs: Optional[List[Tuple[str, str]]] = None, encoder: str = 'libx264',
+                  hwaccel: Optional[str] = None, threads: Optional[int] = None,
+                  uploaded: bool = False):
+    """
+    Common finishing steps: upload to GCS and cleanup.
+    
+    extra_outputs are (resolution, gs:// path) renditions transcoded from output_file in a
+    single FFmpeg pass while it uploads; all outputs then upload in parallel.
+    uploaded means the render was already streamed to output_path_gcs (no local file).
+    """
     
     send_callback(callback_url, job_id, 'PROCESSING', 90)
     
@@ -516,61 +1065,82 @@ def finish_render(job_id: str, output_file: str, output_path_gcs: str, callback_
         send_callback(callback_url, job_id, 'FAILED', 0, error="No output path specified")
         sys.exit(1)
     
-    if not upload_to_gcs(output_file, output_path_gcs):
-        log("Failed to upload output", 'ERROR')
-        send_callback(callback_url, job_id, 'FAILED', 0, error="Failed to upload output")
-        sys.exit(1)
+    extra_outputs = extra_outputs or []
+    renditions = [
+        (resolution, os.path.join(OUTPUT_DIR, f"{job_id}_{k}_{resolution}.mp4"), gcs_path)
+        for k, (resolution, gcs_path) in enumerate(extra_outputs)
+    ]
     
-    # Generate signed URL for download
+    # V4 signing does not need the object to exist, so sign while the upload runs
+    pool = ThreadPoolExecutor(max_workers=len(renditions) + 2)
+    error = None
     try:
-        path_parts = output_path_gcs[5:].split('/', 1)
-        bucket_name = path_parts[0]
-        blob_name = path_parts[1]
+        signed_url = pool.submit(sign_gcs_url, output_path_gcs)
+        uploads = [] if uploaded else [pool.submit(upload_to_gcs, output_file, output_path_gcs)]
         
-        client = storage.Client()
-        bucket = client.bucket(bucket_name)
-        blob = bucket.blob(blob_name)
+        # Extra resolutions: one decode of the master fans out to every rendition's encoder
+        if renditions:
+            log(f"=== Rendering {len(renditions)} Extra Output(s) ===")
+            renditions_cmd = build_renditions_command(
+                output_file, [(resolution, local_path) for resolution, local_path, _ in renditions],
+                encoder=encoder, hwaccel=hwaccel, threads=threads,
+            )
+            if run_ffmpeg(renditions_cmd, timeout=7200):
+                uploads.extend(
+                    pool.submit(upload_to_gcs, local_path, gcs_path) for _, local_path, gcs_path in renditions
+                )
+            else:
+                error = "Extra output render failed"
         
-        # Generate signed URL valid for 7 days
-        from datetime import timedelta
-        signed_url = blob.generate_signed_url(
-            version="v4",
-            expiration=timedelta(days=7),
-            method="GET",
-        )
-        download_url = signed_url
-    except Exception as e:
-        log(f"Failed to generate signed URL: {e}", 'WARN')
-        download_url = output_path_gcs
+        if error is None and not all(upload.result() for upload in uploads):
+            error = "Failed to upload output"
+        download_url = signed_url.result() if error is None else None
+    finally:
+        # Report a failure without waiting on the work still queued behind it
+        pool.shutdown(wait=False, cancel_futures=True)
+    
+    if error is not None:
+        log(error, 'ERROR')
+        send_callback(callback_url, job_id, 'FAILED', 0, error=error)
+        sys.exit(1)
     
-    # Send completion callback
+    # Send completion callback (delivered before the job reports success)
     send_callback(callback_url, job_id, 'COMPLETED', 100, output_url=download_url)
+    flush_callbacks()
     
     log("=== Render Complete ===")
     log(f"Output: {output_path_gcs}")
+    for resolution, gcs_path in extra_outputs:
+        log(f"Output ({resolution}): {gcs_path}")
     
     # Cleanup
     log("Cleaning up temporary files...")
-    import shutil
     shutil.rmtree(ASSETS_DIR, ignore_errors=True)
     shutil.rmtree(OUTPUT_DIR, ignore_errors=True)
+    prune_asset_cache()
     
     log("=== Job Finished Successfully ===")
 
 
 def render_stitch_clips(job_id: str, clip_urls: list, output_path_gcs: str,
-                        resolution: str, fps: int, callback_url: str):
+                        resolution: str, fps: FrameRate, callback_url: str,
+                        encoder: str = 'libx264', hwaccel: Optional[str] = None,
+                        threads: Optional[int] = None,
+                        extra_outputs: Optional[List[Tuple[str, str]]] = None,
+                        stream_upload: bool = False):
     """Concatenate ordered clip URLs into a silent master MP4 (long-take stitch mode)."""
     send_callback(callback_url, job_id, 'PROCESSING', 10)
     log("=== Downloading Assets (Stitch Mode) ===")
 
-    video_segments = []
     for i, url in enumerate(clip_urls):
         if not url:
             log(f"Stitch clip {i} has no URL", 'ERROR')
             send_callback(callback_url, job_id, 'FAILED', 0, error=f"Clip {i} missing URL")
             sys.exit(1)
-        local_file = download_asset(url, 'video', i)
+
+    video_segments = []
+    clip_files = download_assets([(url, 'video', i) for i, url in enumerate(clip_urls)])
+    for i, (url, local_file) in enumerate(zip(clip_urls, clip_files)):
         if not local_file:
             log(f"Failed to download stitch clip {i}", 'ERROR')
             send_callback(callback_url, job_id, 'FAILED', 0, error=f"Failed to download clip {i}")
@@ -597,16 +1167,20 @@ def render_stitch_clips(job_id: str, clip_urls: list, output_path_gcs: str,
         segment_audio_volume=0.0,
         text_overlays=[],
         watermark=None,
+        encoder=encoder,
+        hwaccel=hwaccel,
+        threads=threads,
     )
 
     send_callback(callback_url, job_id, 'PROCESSING', 60)
-    success = run_ffmpeg(ffmpeg_cmd, timeout=7200)
+    success = run_render_command(ffmpeg_cmd, output_path_gcs, stream_upload)
     if not success:
         log("Stitch FFmpeg render failed", 'ERROR')
         send_callback(callback_url, job_id, 'FAILED', 0, error="Stitch FFmpeg render failed")
         sys.exit(1)
 
-    finish_render(job_id, output_file, output_path_gcs, callback_url)
+    finish_render(job_id, output_file, output_path_gcs, callback_url,
+                  extra_outputs, encoder, hwaccel, threads, uploaded=stream_upload)
 
 
 if __name__ == '__main__':
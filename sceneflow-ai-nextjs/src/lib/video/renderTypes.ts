@@ -91,6 +91,22 @@ export interface AnimaticKenBurnsConfig {
   transitionDuration: number
 }
 
+/**
+ * Renderer hardware acceleration: 'cuda' decodes and encodes on the GPU (NVDEC/NVENC)
+ */
+export type RenderHwAccel = 'cuda' | 'none'
+
+/**
+ * Extra rendition of a job's output, transcoded from the finished main render
+ * (one extra FFmpeg pass encodes every rendition)
+ */
+export interface RenderOutput {
+  /** Rendition resolution */
+  resolution: '720p' | '1080p' | '4K'
+  /** GCS path for this rendition (gs://bucket/path) */
+  path: string
+}
+
 /**
  * Complete render job specification
  * This is uploaded to GCS as job_spec.json and read by the Cloud Run renderer
@@ -128,6 +144,12 @@ export interface RenderJobSpec {
   includeSubtitles?: boolean
   /** Ken Burns configuration (for animatic renders) */
   kenBurnsConfig?: AnimaticKenBurnsConfig
+  /** Hardware acceleration on GPU renderer instances (default: the renderer image's setting) */
+  hwAccel?: RenderHwAccel
+  /** FFmpeg filter/encoder thread count (default: every CPU the renderer container may use) */
+  threads?: number
+  /** Additional resolutions to produce alongside outputPath */
+  outputs?: RenderOutput[]
 }
 
 /**
@@ -410,6 +432,16 @@ export interface SceneRenderJobSpec {
   textOverlays?: SceneRenderTextOverlay[]
   /** Watermark to burn into the video (full duration) */
   watermark?: SceneRenderWatermark
+  /** Hardware acceleration on GPU renderer instances (default: the renderer image's setting) */
+  hwAccel?: RenderHwAccel
+  /** FFmpeg filter/encoder thread count (default: every CPU the renderer container may use) */
+  threads?: number
+  /** Let FFmpeg read http(s) video segments from their URLs instead of downloading them first */
+  streamInputs?: boolean
+  /** Additional resolutions to produce alongside outputPath */
+  outputs?: RenderOutput[]
+  /** Upload the output as fragmented MP4 while it encodes (ignored when outputs is set) */
+  streamUpload?: boolean
 }
 
 /**
@@ -595,4 +627,8 @@ export interface StitchRenderJobSpec {
   callbackUrl?: string
   createdAt: string
   renderMode: 'stitch'
+  hwAccel?: RenderHwAccel
+  threads?: number
+  outputs?: RenderOutput[]
+  streamUpload?: boolean
 }